@@ -0,0 +1,152 @@
+import numpy as np
+from scipy.special import ndtr
+import Greeks
+
+# American exercise pricing for the single stock chains from Finviz, which are American options.
+# No dividends are modeled, so an American call is never exercised early and is worth the European call. Only puts
+# get an early exercise premium.
+# bawPrice - Barone-Adesi-Whaley quadratic approximation, closed form once the critical stock price is found,
+#            used for whole chains
+# binomialPrice - Cox-Ross-Rubinstein lattice over the whole chain at once, slower but converges to the exact
+#                 American price as steps grow, used to check bawPrice
+# The Black-Scholes functions in Greeks stay the European path.
+
+
+def criticalPutPrice(K, T, r, sigma, tol=1e-10, max_iterations=50):
+    # Input (in order): Strike prices, Until Maturity, Lending rate, Volatility (arrays), Tolerance, Max iterations
+    # Output: (critical stock price below which the put is exercised, q1 exponent, A1 premium coefficient)
+    # Does not depend on the stock price, so callers bumping the stock price can compute it once.
+    # Newton iteration from Barone-Adesi and Whaley's seed, only contracts that have not converged are iterated.
+    K, T, sigma = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (K, T, sigma)))
+    sigmaRootT = sigma * np.sqrt(T)
+    n = 2 * r / sigma ** 2
+    q1 = (-(n - 1) - np.sqrt((n - 1) ** 2 + 4 * n / (1 - np.exp(-r * T)))) / 2
+    q1Infinite = (-(n - 1) - np.sqrt((n - 1) ** 2 + 4 * n)) / 2
+    criticalInfinite = K / (1 - 1 / q1Infinite)  # Critical price of a perpetual put, the lowest it can be
+    # The critical price lies between criticalInfinite and K, at low volatility the seed would overshoot K
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        h1 = np.minimum((r * T - 2 * sigmaRootT) * K / (K - criticalInfinite), 0.0)
+    critical = np.where(np.isfinite(h1), criticalInfinite + (K - criticalInfinite) * np.exp(h1), K)
+
+    active = np.flatnonzero(np.ones(K.shape, dtype=bool))
+    for i in range(max_iterations):
+        if active.size == 0:
+            break
+        s, k, t, vol, q = critical[active], K[active], T[active], sigma[active], q1[active]
+        d1, d2 = Greeks.calculateD1(s, k, t, r, vol)
+        put = k * np.exp(-r * t) * ndtr(-d2) - s * ndtr(-d1)
+        rhs = put - (1 - ndtr(-d1)) * s / q
+        slope = -ndtr(-d1) * (1 - 1 / q) - (1 + Greeks.normalPDF(d1) / (vol * np.sqrt(t))) / q
+        done = np.abs(k - s - rhs) / k < tol
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = (k - rhs + slope * s) / (1 + slope)
+        step = np.where(np.isfinite(step), step, 0.5 * (s + k))
+        critical[active] = np.where(done, s, np.clip(step, criticalInfinite[active], k))
+        active = active[~done]
+
+    d1, d2 = Greeks.calculateD1(critical, K, T, r, sigma)
+    A1 = -(critical / q1) * (1 - ndtr(-d1))
+    return critical, q1, A1
+
+def bawPrice(S, K, T, r, sigma, isCall, critical=None):
+    # Input (in order): Stock price, Strike prices, Until Maturity, Lending rate, Volatility, Call mask,
+    #                   criticalPutPrice output for the puts when already known
+    # Output: American price array, same shape as BS_CHAIN
+    S, K, T, sigma, isCall = np.broadcast_arrays(np.asarray(S, dtype=float), np.asarray(K, dtype=float),
+                                                 np.asarray(T, dtype=float), np.asarray(sigma, dtype=float),
+                                                 np.asarray(isCall, dtype=bool))
+    price = Greeks.BS_CHAIN(S, K, T, r, sigma, isCall)
+    puts = ~isCall
+    if r <= 0 or not puts.any():  # Without interest there is nothing to gain from exercising a put early
+        return price
+    if critical is None:
+        critical = criticalPutPrice(K[puts], T[puts], r, sigma[puts])
+    criticalPrice, q1, A1 = critical
+    s, k = S[puts], K[puts]
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        american = np.where(s > criticalPrice, price[puts] + A1 * (s / criticalPrice) ** q1, k - s)
+    price[puts] = np.maximum(american, np.maximum(k - s, 0.0))  # Never worth less than exercising now
+    return price
+
+def binomialPrice(S, K, T, r, sigma, isCall, steps=500):
+    # Input (in order): Same as bawPrice, number of time steps in the lattice
+    # Output: American price array
+    # Every contract gets its own row of lattice nodes and the whole chain steps back through time together,
+    # so memory is contracts x (steps + 1) floats.
+    S, K, T, sigma, isCall = np.broadcast_arrays(np.asarray(S, dtype=float), np.asarray(K, dtype=float),
+                                                 np.asarray(T, dtype=float), np.asarray(sigma, dtype=float),
+                                                 np.asarray(isCall, dtype=bool))
+    shape = S.shape
+    S, K, T, sigma, isCall = (x.reshape(-1, 1) for x in (S, K, T, sigma, isCall))
+    dt = T / steps
+    up = np.exp(sigma * np.sqrt(dt))
+    discount = np.exp(-r * dt)
+    probability = (np.exp(r * dt) - 1 / up) / (up - 1 / up)
+    sign = np.where(isCall, 1.0, -1.0)  # Payoff is sign * (stock - strike)
+
+    exponents = 2 * np.arange(steps + 1) - steps  # Up moves minus down moves at expiration
+    values = np.maximum(sign * (S * up ** exponents - K), 0.0)
+    for step in range(steps - 1, -1, -1):
+        values = discount * (probability * values[:, 1:step + 2] + (1 - probability) * values[:, :step + 1])
+        exponents = 2 * np.arange(step + 1) - step
+        values = np.maximum(values, sign * (S * up ** exponents - K))  # Exercise now if it is worth more
+    return values.reshape(shape)
+
+def impliedVolatilityChain(marketPrice, S, K, T, r, isCall, tol=1e-8, max_iterations=100, lower=1e-4, upper=10.0):
+    # Input and Output: Same as Greeks.impliedVolatilityChain, but prices are inverted through bawPrice
+    return Greeks.impliedVolatilityChain(marketPrice, S, K, T, r, isCall, tol, max_iterations, lower, upper,
+                                         priceFunction=bawPrice)
+
+def calculateGreeksChain(S, K, T, r, sigma, isCall, greeks=Greeks.ALL_GREEKS):
+    # Input and Output: Same as Greeks.calculateGreeksChain
+    # Calls take the European formulas. Puts are bumped and repriced with bawPrice using central differences,
+    # the critical price is reused for the stock price bumps since it does not depend on the stock price.
+    unknown = set(greeks) - set(Greeks.ALL_GREEKS)
+    if unknown:
+        raise ValueError(f"Unknown Greeks {sorted(unknown)}. Use any of {', '.join(Greeks.ALL_GREEKS)}.")
+
+    S, K, T, sigma, isCall = np.broadcast_arrays(np.asarray(S, dtype=float), np.asarray(K, dtype=float),
+                                                 np.asarray(T, dtype=float), np.asarray(sigma, dtype=float),
+                                                 np.asarray(isCall, dtype=bool))
+    european = Greeks.calculateGreeksChain(S, K, T, r, sigma, isCall, greeks)
+    puts = ~isCall
+    if r <= 0 or not puts.any():  # Nothing is exercised early, the European Greeks are exact
+        return european
+
+    s, k, t, vol = S[puts], K[puts], T[puts], sigma[puts]
+    call = np.zeros(s.shape, dtype=bool)
+    dS, dVol, dT, dR = s * 1e-3, vol * 1e-3, t * 1e-3, 1e-4
+    critical = {0: criticalPutPrice(k, t, r, vol)}  # By volatility bump, reused across the stock price bumps
+    def price(spot=0, volatility=0, maturity=0, rate=0):
+        # Put prices with the stock price, volatility, maturity or rate moved by that many bumps
+        if volatility not in critical and not (maturity or rate):
+            critical[volatility] = criticalPutPrice(k, t, r, vol + volatility * dVol)
+        return bawPrice(s + spot * dS, k, t + maturity * dT, r + rate * dR, vol + volatility * dVol, call,
+                        None if maturity or rate else critical[volatility])
+
+    prices = {}
+    def bumped(*bumps):  # Shared prices like the volatility up/down ones are only computed once
+        if bumps not in prices:
+            prices[bumps] = price(*bumps)
+        return prices[bumps]
+
+    formulas = {
+        'Delta': lambda: (bumped(1, 0) - bumped(-1, 0)) / (2 * dS),
+        'Gamma': lambda: (bumped(1, 0) - 2 * bumped(0, 0) + bumped(-1, 0)) / dS ** 2,
+        'Vega': lambda: (bumped(0, 1) - bumped(0, -1)) / (2 * dVol),
+        'Theta': lambda: -(price(maturity=1) - price(maturity=-1)) / (2 * dT),
+        'Rho': lambda: (price(rate=1) - price(rate=-1)) / (2 * dR),
+        'Vanna': lambda: (bumped(1, 1) - bumped(1, -1) - bumped(-1, 1) + bumped(-1, -1)) / (4 * dS * dVol),
+        'Volga': lambda: (bumped(0, 1) - 2 * bumped(0, 0) + bumped(0, -1)) / dVol ** 2,
+    }
+    for name in greeks:
+        values = np.array(european[name], dtype=float)
+        values[puts] = formulas[name]()
+        european[name] = values
+    return european
+
+# What priceChain looks up for exercise='european' or 'american'
+PRICERS = {
+    'european': (Greeks.BS_CHAIN, Greeks.impliedVolatilityChain, Greeks.calculateGreeksChain),
+    'american': (bawPrice, impliedVolatilityChain, calculateGreeksChain),
+}
@@ -0,0 +1,266 @@
+import argparse
+import atexit
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import American
+import GetInformation
+import Greeks
+import Main
+import Store
+
+# Offline benchmark suite, no Finviz/FRED/Yahoo keys needed. Chains are generated synthetically with the same
+# columns as the Finviz export, every benchmark is timed at each size, and the throughput (contracts per second)
+# and peak traced memory are written to a JSON file and compared against a stored baseline.
+# Import time of Main, GetInformation and Greeks is measured the same way so startup stays fast.
+# Run: python Benchmark.py [--sizes 1000 10000 100000] [--update-baseline]
+SIZES = [1000, 10000, 100000]
+SCALAR_SAMPLE = 2000  # The scalar row-by-row functions are timed on at most this many contracts and scaled
+RESULTS_FILE = 'benchmark_results.json'
+BASELINE_FILE = 'benchmark_baseline.json'
+TOLERANCE = 0.25  # Allowed slowdown (and memory growth) against the baseline before the run fails
+SPOT, RATE, UNTIL_MATURITY = 100.0, 0.05, 30 / 365
+IMPORT_MODULES = ['Main', 'GetInformation', 'Greeks']  # Startup cost of a pricing-only run
+
+
+def syntheticChain(numContracts, spot=SPOT, untilMaturity=UNTIL_MATURITY, r=RATE, seed=0):
+    # Input: Number of contracts, Stock price, Until Maturity, Lending rate, random seed
+    # Output: DataFrame shaped like a Finviz export (Strike, Type, Bid, Ask, Last Close, Last Trade, Volume, Open Int)
+    # Calls and puts share strikes from 50% to 150% of spot, priced with Black-Scholes on a volatility smile and
+    # given a bid/ask spread, a noisy last close and last trades one second apart.
+    rng = np.random.default_rng(seed)
+    strikes = np.round(np.linspace(0.5 * spot, 1.5 * spot, (numContracts + 1) // 2), 2)
+    strike = np.repeat(strikes, 2)[:numContracts]
+    isCall = np.tile([True, False], len(strikes))[:numContracts]
+    sigma = 0.3 + 0.4 * np.log(strike / spot) ** 2
+    price = np.maximum(Greeks.BS_CHAIN(spot, strike, untilMaturity, r, sigma, isCall), 0.01)
+    spread = np.maximum(0.01, 0.02 * price)
+    start = datetime.now().replace(microsecond=0) - timedelta(seconds=numContracts)
+    return pd.DataFrame({
+        'Strike': strike,
+        'Type': np.where(isCall, 'call', 'put'),
+        'Bid': np.round(np.maximum(price - spread / 2, 0.0), 2),
+        'Ask': np.round(price + spread / 2, 2),
+        'Last Close': np.round(price * (1 + rng.normal(0, 0.01, numContracts)), 2),
+        'Last Trade': [(start + timedelta(seconds=i)).strftime(Store.TRADE_FORMAT) for i in range(numContracts)],
+        'Volume': rng.integers(0, 5000, numContracts),
+        'Open Int': rng.integers(0, 50000, numContracts),
+    })
+
+def syntheticExport(numContracts, **options):
+    # Output: Raw CSV bytes, as the Finviz export response body would be
+    return syntheticChain(numContracts, **options).to_csv(index=False).encode()
+
+def measure(function, repeat=3):
+    # Input: Callable with no arguments, number of timed runs
+    # Output: (best seconds, peak traced bytes)
+    # Memory is measured on a separate run since tracemalloc itself slows things down.
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best, peak
+
+
+# Every benchmark takes the synthetic chain (already parsed) and returns (callable, contracts it handles)
+def scalarPrices(chain):
+    sample = chain.head(SCALAR_SAMPLE)
+    def run():
+        for K, kind in zip(sample['Strike'], sample['Type']):
+            (Greeks.BS_CALL if kind == 'call' else Greeks.BS_PUT)(SPOT, K, UNTIL_MATURITY, RATE, 0.3)
+    return run, len(sample)
+
+def chainPrices(chain):
+    strikes, isCall = chain['Strike'].to_numpy(), (chain['Type'] == 'call').to_numpy()
+    return lambda: Greeks.BS_CHAIN(SPOT, strikes, UNTIL_MATURITY, RATE, 0.3, isCall), len(chain)
+
+def scalarImpliedVolatility(chain):
+    sample = chain.head(SCALAR_SAMPLE)
+    mid = ((sample['Bid'] + sample['Ask']) / 2).to_numpy()
+    def run():
+        for price, K, kind in zip(mid, sample['Strike'], sample['Type']):
+            (Greeks.sigmaCall if kind == 'call' else Greeks.sigmaPut)(price, SPOT, K, UNTIL_MATURITY, RATE, 0.3,
+                                                                      1e-8, 1000)
+    return run, len(sample)
+
+def chainImpliedVolatility(chain):
+    strikes, isCall = chain['Strike'].to_numpy(), (chain['Type'] == 'call').to_numpy()
+    mid = ((chain['Bid'] + chain['Ask']) / 2).to_numpy()
+    return lambda: Greeks.impliedVolatilityChain(mid, SPOT, strikes, UNTIL_MATURITY, RATE, isCall), len(chain)
+
+def scalarGreeks(chain):
+    sample = chain.head(SCALAR_SAMPLE)
+    def run():
+        for K, kind in zip(sample['Strike'], sample['Type']):
+            Greeks.calculateDelta(SPOT, K, RATE, UNTIL_MATURITY, 0.3, kind)
+            Greeks.calculateVega(SPOT, K, RATE, UNTIL_MATURITY, 0.3)
+    return run, len(sample)
+
+def chainGreeks(chain):
+    strikes, isCall = chain['Strike'].to_numpy(), (chain['Type'] == 'call').to_numpy()
+    return lambda: Greeks.calculateGreeksChain(SPOT, strikes, UNTIL_MATURITY, RATE, 0.3, isCall), len(chain)
+
+def americanChain(chain):
+    # Full American reprice of the chain: Barone-Adesi-Whaley prices, implied volatility and Greeks
+    strikes, isCall = chain['Strike'].to_numpy(), (chain['Type'] == 'call').to_numpy()
+    mid = ((chain['Bid'] + chain['Ask']) / 2).to_numpy()
+    def run():
+        American.bawPrice(SPOT, strikes, UNTIL_MATURITY, RATE, 0.3, isCall)
+        sigma, iterations, converged = American.impliedVolatilityChain(mid, SPOT, strikes, UNTIL_MATURITY, RATE,
+                                                                       isCall)
+        American.calculateGreeksChain(SPOT, strikes, UNTIL_MATURITY, RATE, sigma, isCall, ('Delta', 'Vega'))
+    return run, len(chain)
+
+def pipeline(chain):
+    # Export bytes -> parsed chain -> priced with IV and Greeks -> final CSV, all in memory
+    content = chain.to_csv(index=False).encode()
+    def run():
+        priced, iterations, converged = Main.priceChain(GetInformation.parseOptionChain(content).dropna(), SPOT,
+                                                        UNTIL_MATURITY, RATE, 0.3)
+        priced.to_csv(io.StringIO(), index=False)
+    return run, len(chain)
+
+def graph(chain):
+    # Stores the chain as the snapshot of next Friday in a scratch directory, then loads, aggregates and draws it
+    # headless. The scratch directory is removed when the run exits.
+    import Graph
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    root = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, root, ignore_errors=True)
+    tick = 'BENCH'
+    expiration = GetInformation.findNextFridays(1)[0]
+    Store.saveSnapshot(tick, expiration, GetInformation.parseOptionChain(chain.to_csv(index=False).encode()),
+                       root=os.path.join(root, Store.STORE_DIR))
+    figure = Figure(figsize=(14, 7))
+    FigureCanvasAgg(figure)
+    def run():
+        cwd = os.getcwd()
+        os.chdir(root)  # The store lives under data/ relative to the working directory
+        try:
+            figure.clear()
+            Graph.drawGraph(figure.add_subplot(), Graph.loadCandles(tick, 1))
+            figure.savefig(io.BytesIO(), format='png')
+        finally:
+            os.chdir(cwd)
+    return run, len(chain)
+
+BENCHMARKS = {
+    'BS_CALL/BS_PUT': scalarPrices,
+    'BS_CHAIN': chainPrices,
+    'sigmaCall/sigmaPut': scalarImpliedVolatility,
+    'impliedVolatilityChain': chainImpliedVolatility,
+    'calculateDelta/calculateVega': scalarGreeks,
+    'calculateGreeksChain': chainGreeks,
+    'americanChain': americanChain,
+    'pipeline': pipeline,
+    'createGraph': graph,
+}
+
+
+def runBenchmarks(sizes=SIZES, names=None, repeat=3):
+    # Input: Chain sizes, benchmark names (all when None), timed runs per benchmark
+    # Output: {name: {size: {'seconds', 'contracts', 'throughput', 'peak_mb'}}}
+    results = {}
+    for size in sizes:
+        chain = GetInformation.parseOptionChain(syntheticExport(size))
+        for name in names or BENCHMARKS:
+            run, contracts = BENCHMARKS[name](chain)
+            seconds, peak = measure(run, repeat)
+            results.setdefault(name, {})[str(size)] = {
+                'seconds': seconds, 'contracts': contracts,
+                'throughput': contracts / seconds if seconds else float('inf'), 'peak_mb': peak / 2 ** 20}
+            print(f'{name:32s} {size:>7d}  {seconds * 1000:10.2f} ms  {contracts / seconds:14,.0f} contracts/s'
+                  f'  {peak / 2 ** 20:8.1f} MB')
+    return results
+
+def measureImportTimes(modules=IMPORT_MODULES, repeat=3):
+    # Input: Module names, fresh interpreters per module
+    # Output: {module: best seconds to import it in a new interpreter}
+    # Every import runs in its own interpreter so nothing is already loaded.
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = {}
+    for module in modules:
+        code = f'import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)'
+        runs = [float(subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True,
+                                     check=True).stdout) for i in range(repeat)]
+        times[module] = min(runs)
+        print(f'{"import " + module:32s} {times[module] * 1000:10.2f} ms')
+    return times
+
+def compareImportTimes(times, baseline, tolerance=TOLERANCE):
+    # Output: Regression messages for imports slower than the baseline (50 ms of slack for process noise)
+    return [f'import {module}: {seconds * 1000:.0f} ms, baseline {baseline[module] * 1000:.0f} ms'
+            for module, seconds in times.items()
+            if module in baseline and seconds > baseline[module] * (1 + tolerance) + 0.05]
+
+def compareBaseline(results, baseline, tolerance=TOLERANCE):
+    # Input: Fresh results, stored baseline results, allowed relative slowdown/memory growth
+    # Output: List of regression messages, empty when everything is within tolerance
+    regressions = []
+    for name, bySize in results.items():
+        for size, result in bySize.items():
+            expected = baseline.get(name, {}).get(size)
+            if expected is None:
+                continue
+            if result['throughput'] < expected['throughput'] * (1 - tolerance):
+                regressions.append(f"{name} at {size}: {result['throughput']:,.0f} contracts/s, "
+                                   f"baseline {expected['throughput']:,.0f}")
+            if result['peak_mb'] > expected['peak_mb'] * (1 + tolerance) + 1:
+                regressions.append(f"{name} at {size}: peak {result['peak_mb']:.1f} MB, "
+                                   f"baseline {expected['peak_mb']:.1f} MB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmarks for pricing, IV, Greeks, pipeline and graph.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=RESULTS_FILE)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--update-baseline', action='store_true', help='Store this run as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.sizes, args.only, args.repeat)
+    importTimes = measureImportTimes(repeat=args.repeat)
+    report = {'python': platform.python_version(), 'machine': platform.machine(),
+              'time': datetime.now().isoformat(timespec='seconds'), 'results': results,
+              'import_seconds': importTimes}
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'Baseline updated: {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --update-baseline to create one')
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compareBaseline(results, baseline['results'], args.tolerance)
+    regressions += compareImportTimes(importTimes, baseline.get('import_seconds', {}), args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
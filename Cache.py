@@ -0,0 +1,115 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+# Local on-disk cache for market inputs so reruns don't hit FRED, Yahoo Finance or Finviz for values that can't have changed.
+# Every source has its own time to live in seconds:
+# fedfunds - FEDFUNDS is released monthly, so a day old value is still the latest one
+# history - daily bars only change once a day, stale entries are extended with the missing bars instead of refetched
+# quote - the spot quote is on the minute timeframe, so it is only reused for a minute
+DEFAULT_TTLS = {'fedfunds': 24 * 3600, 'history': 6 * 3600, 'quote': 60}
+
+
+def atomicWrite(path, data):
+    # Input: Destination path and bytes
+    # Output: None, the file at path is replaced in one step
+    # Purpose: Write to a temporary file next to the target and rename it over, so readers (or other worker
+    #          processes) never see a half written file.
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class DiskCache:
+    # Pickled entries under one directory, one file per (source, key).
+    # Reads past the source's TTL count as misses, and once the directory grows past max_bytes the least recently
+    # used entries are evicted. hits and misses are counted per source for the end of run summary.
+
+    def __init__(self, directory=os.path.join('data', 'cache'), max_bytes=50 * 1024 * 1024, ttls=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = {}
+        self.misses = {}
+        self.lock = threading.Lock()  # Counters are shared by the download threads
+
+    def path(self, source, key):
+        # Keys can contain API keys, so only a hash of them goes into the file name
+        digest = hashlib.sha1(str(key).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f'{source}_{digest}.pkl')
+
+    def count(self, counter, source):
+        with self.lock:
+            counter[source] = counter.get(source, 0) + 1
+
+    def load(self, source, key):
+        # Input: Source name and key
+        # Output: (value, seconds since it was stored) or (None, None) if nothing is stored, ignores the TTL
+        # Used when an expired entry is still worth extending, like price history.
+        try:
+            with open(self.path(source, key), 'rb') as file:
+                stored, value = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None, None
+        try:
+            os.utime(self.path(source, key))  # Marks the entry as recently used for eviction
+        except OSError:  # Evicted by another process since we read it
+            pass
+        return value, time.time() - stored
+
+    def get(self, source, key):
+        # Input: Source name and key
+        # Output: Stored value, or None on a miss or when the entry is older than the source's TTL
+        value, age = self.load(source, key)
+        if value is None or age > self.ttls.get(source, 0):
+            self.count(self.misses, source)
+            return None
+        self.count(self.hits, source)
+        return value
+
+    def set(self, source, key, value):
+        # Input: Source name, key and any picklable value
+        # Output: None, the entry is written atomically and the cache trimmed back under max_bytes
+        atomicWrite(self.path(source, key), pickle.dumps((time.time(), value)))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                try:
+                    status = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):  # Oldest used first
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:  # Another process evicted it first
+                pass
+            total -= size
+
+    def resetStats(self):
+        # Starts the hit/miss counts over, for a summary of one run in a process that runs several
+        with self.lock:
+            self.hits.clear()
+            self.misses.clear()
+
+    def stats(self):
+        # Output: Dictionary of source -> {'hits': n, 'misses': n}
+        sources = set(self.hits) | set(self.misses)
+        return {source: {'hits': self.hits.get(source, 0), 'misses': self.misses.get(source, 0)}
+                for source in sorted(sources)}
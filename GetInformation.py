@@ -1,10 +1,86 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from fredapi import Fred
 import pandas as pd
-import numpy as np
-import yfinance as yf
+import threading
+import io
+import time
 import os
+import Cache
+import Instrument
+import Volatility
+
+# requests, fredapi and yfinance are imported inside the functions that use them, so importing this module (and Main)
+# doesn't pay for them on runs that never go to the network.
+
+FINVIZ_URL = "https://elite.finviz.com"  # Base url for Finviz, can be pointed at a local server for testing
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+RETRY_STATUS = {429, 500, 502, 503, 504}  # Responses worth another attempt, anything else is final
+# Columns of the Finviz export that are actually used, with the dtype each one is parsed as
+CHAIN_COLUMNS = {'Strike': 'float64', 'Type': 'category', 'Bid': 'float64', 'Ask': 'float64',
+                 'Last Close': 'float64', 'Last Trade': 'string'}
+cache = Cache.DiskCache()  # Shared on-disk cache for the fed funds rate, price history and spot quote
+
+
+class RateLimiter:
+    # Token bucket shared by every download thread so we stay under the Finviz request limits.
+    # Tokens refill at `rate` per second up to `burst`, each request takes one and waits if the bucket is empty.
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)  # Sleep outside the lock so other threads can check the bucket
+
+
+def createSession(pool_size=10):
+    # Input: Number of keep-alive connections to hold open
+    # Output: requests Session reused by every download
+    # Purpose: One pooled session avoids a new TCP/TLS handshake for every expiration.
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def requestWithRetry(session, url, params=None, timeout=10, retries=3, backoff=0.5, limiter=None):
+    # Input: Session, url and query parameters, timeout in seconds, retry count, base backoff, optional rate limiter
+    # Output: Successful response
+    # Purpose: Retries timeouts, dropped connections and 429/5xx responses with exponential backoff.
+    import requests
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+            continue
+        if response.status_code in RETRY_STATUS and attempt < retries:
+            retryAfter = response.headers.get('Retry-After', '')  # Finviz tells us how long to wait on a 429
+            time.sleep(float(retryAfter) if retryAfter.isdigit() else backoff * 2 ** attempt)
+            continue
+        response.raise_for_status()
+        return response
 
 
 def findNextFridays(num_fridays):
@@ -23,14 +99,11 @@ def findNextFridays(num_fridays):
         current_date += timedelta(days=1) #Since current_date is a date time object, you can't just add the integer 1.
     return next_fridays #Returns array
 
-def getOptionChains(tick, expiration, key):
+def downloadOptionChain(tick, expiration, key, session=None, limiter=None, timeout=10, retries=3, base_url=FINVIZ_URL):
     # Input: Tick to track, expiration date for contract, and key to access API
-    # Output: Downloads CSV to data directory, returns path for main
-    # Purpose: This is my main API for getting option chains data.
-
-    # Creates data folder
-    if not os.path.exists('data'):
-        os.makedirs('data')
+    #        Optional shared session, rate limiter, timeout, retries and base url (used by fetchOptionChains)
+    # Output: (expiration as a string, raw CSV bytes of the Finviz export)
+    # Purpose: Shared request for getOptionChains and getOptionChainFrame.
 
     # Expiration date validation
     if isinstance(expiration, datetime):  # If datetime object, then set format for string
@@ -40,29 +113,72 @@ def getOptionChains(tick, expiration, key):
     else:  #Exception thrown
         raise TypeError("expiration must be a string or datetime object")
 
-    # Writing the path for ease of use and to set destination
-    file_path = os.path.join('data', f"{tick}_{expiration_str}_export.csv")
-
     # Construct URL accepting parameters using format in Finviz API.
-    URL = f"https://elite.finviz.com/export/options?t={tick}&ty=oc&e={expiration_str}&auth={key}"
+    URL = f"{base_url}/export/options"
+    payload = {"t": tick, "ty": "oc", "e": expiration_str, "auth": key}
 
     # Request form filled with URL and Response is what we get back.
-    response = requests.get(URL)
+    if session is None:
+        session = createSession(pool_size=1)
+    with Instrument.stage('download', tick=tick, expiration=expiration_str) as record:
+        response = requestWithRetry(session, URL, params=payload, timeout=timeout, retries=retries, limiter=limiter)
+        record['bytes'] = len(response.content)
+    return expiration_str, response.content  # Response gets data in CSV format according to documentation.
 
-    # Save the file
+def saveExport(tick, expiration_str, content):
+    # Input: Tick, expiration string and raw export bytes
+    # Output: Path of the CSV written to the data directory
+    os.makedirs('data', exist_ok=True)  # exist_ok since several download threads can get here at once
+    file_path = os.path.join('data', f"{tick}_{expiration_str}_export.csv")
     with open(file_path, "wb") as file:  # Opens writing mode in binary
-        file.write(response.content)  # Response gets data in CSV format according to documentation.
+        file.write(content)
+    return file_path
 
-    return file_path #We return path as previously stated for ease of use in main.
+def getOptionChains(tick, expiration, key, **options):
+    # Input: Tick to track, expiration date for contract, and key to access API, options as in downloadOptionChain
+    # Output: Downloads CSV to data directory, returns path for main
+    # Purpose: This is my main API for getting option chains data.
+    expiration_str, content = downloadOptionChain(tick, expiration, key, **options)
+    return saveExport(tick, expiration_str, content) #We return path as previously stated for ease of use in main.
+
+def parseOptionChain(content):
+    # Input: Raw CSV bytes of a Finviz export
+    # Output: DataFrame with only the CHAIN_COLUMNS, already in their pinned dtypes
+    # Purpose: Parses the response body straight into memory instead of saving and re-reading it.
+    try:
+        return pd.read_csv(io.BytesIO(content), usecols=list(CHAIN_COLUMNS), dtype=CHAIN_COLUMNS, na_values=['-'])
+    except ValueError as e:
+        # Usually the oauth form instead of a CSV, see Bugs in the README
+        raise ValueError(f"Finviz export could not be parsed, check the Finviz key: {e}") from e
+
+def getOptionChainFrame(tick, expiration, key, debug=False, **options):
+    # Input: Tick to track, expiration date for contract, and key to access API, options as in downloadOptionChain
+    #        debug also saves the raw export to the data directory like getOptionChains
+    # Output: Parsed DataFrame of the chain
+    expiration_str, content = downloadOptionChain(tick, expiration, key, **options)
+    if debug:
+        print(f'File saved to: {saveExport(tick, expiration_str, content)}')
+    with Instrument.stage('parse', tick=tick, expiration=expiration_str) as record:
+        chain = parseOptionChain(content)
+        record['rows'] = len(chain)
+    return chain
 
 
-def getFedFundsRate(api_key):
-    # Input: Saint Louis Federal Bank API Key
+def getFedFundsRate(api_key, use_cache=True):
+    # Input: Saint Louis Federal Bank API Key, whether the on-disk cache may answer
     # Output: The Federal Funds Interest rate as used in Black Scholes formulas.
     # Purpose: I would use Yahoo Finance, but this is just for calculations in relation to Strike Price.
-    fred = Fred(api_key=api_key) # Saint Louis Federal Bank API Object
-    data = fred.get_series_latest_release('FEDFUNDS') #G Gets latest lending rates
-    return data.iloc[-1] #Retrieves latest value
+    if use_cache:
+        rate = cache.get('fedfunds', 'FEDFUNDS')
+        if rate is not None:
+            return rate
+    from fredapi import Fred
+    with Instrument.stage('fed_funds'):
+        fred = Fred(api_key=api_key) # Saint Louis Federal Bank API Object
+        data = fred.get_series_latest_release('FEDFUNDS') #G Gets latest lending rates
+    rate = data.iloc[-1] #Retrieves latest value
+    cache.set('fedfunds', 'FEDFUNDS', rate)
+    return rate
 
 def getDaysUntil(targetDate):
     # Input: Target date
@@ -83,7 +199,7 @@ def getDaysUntil(targetDate):
     days_until = (target_date - today).days  # Integer coercion into integer while using datetime objects for arithmetic.
     return days_until # Returns after making it integer.
 
-def getCurrentPrice(tick):
+def getCurrentPrice(tick, session=None, limiter=None, timeout=10, retries=3, base_url=FINVIZ_URL, use_cache=True):
     # Not written by me, Written by another student
     # Input: Stock ticker
     # Output: Most recent traded price
@@ -94,18 +210,26 @@ def getCurrentPrice(tick):
     time_frame = "i1" # Tracking interval i1 is every minute
     types = "stock" # Stock is underlying asset for option contracts
 
-    URL = f"https://elite.finviz.com/api/quote.ashx"  # Base url for finviz screener.
+    if use_cache:
+        last = cache.get('quote', tick)
+        if last is not None:
+            return last
+
+    URL = f"{base_url}/api/quote.ashx"  # Base url for finviz screener.
 
-    #Payload is request format and header is to show a real individual is trying to access the API.
+    #Payload is request format and header (set on the session) is to show a real individual is trying to access the API.
     payload = {"instrument": types, "ticker": ticker, "timeframe": time_frame, "type": "new"}
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    if session is None:
+        session = createSession(pool_size=1)
+
+    import requests
 
     # Try throw exception,
     try:
-        response = requests.get(URL, params=payload, headers=headers) # Request call made according to payload and header.
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
+        # Request call made according to payload and header, raises HTTPError for bad responses (4xx and 5xx)
+        with Instrument.stage('quote', tick=tick) as record:
+            response = requestWithRetry(session, URL, params=payload, timeout=timeout, retries=retries, limiter=limiter)
+            record['bytes'] = len(response.content)
 
         json_response = response.json() # Converts the plain text json into a json file
         # Extract data assuming the response structure
@@ -113,6 +237,7 @@ def getCurrentPrice(tick):
         if data_id: # data ID is a tuple for (id of last trade, last trade value)
             # Grab the last trade value and id is available but not used.
             id, last = data_id.split("|") # split by delimiter |
+            cache.set('quote', tick, last)
             return last
         else:
             print("dataId not found in the response.") # Error in Json
@@ -125,23 +250,137 @@ def getCurrentPrice(tick):
     except KeyError as e:
         print(f"Missing key in the response: {e}")
 
-def getHistoricalVolatility(ticker, days=30):
-    # Input: tick for tracking and 30 days since current attempt is looking at monthly history.
+def fetchOptionChains(tick, expirations, key, max_workers=8, requests_per_second=5, timeout=10, retries=3,
+                      base_url=FINVIZ_URL, debug=False, use_cache=True):
+    # Input: Tick, list of expirations, Finviz key, concurrency cap, rate limit, timeout, retries and base url
+    #        debug also saves every raw export to the data directory, use_cache lets the quote come from the cache
+    # Output: (list of parsed chains in the same order as expirations, current price)
+    # Purpose: Downloads every expiration and the spot quote at the same time over one keep-alive session
+    #          instead of waiting on each request in turn.
+    session = createSession(pool_size=max_workers)
+    limiter = RateLimiter(requests_per_second)
+    options = dict(session=session, limiter=limiter, timeout=timeout, retries=retries, base_url=base_url)
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        price = pool.submit(getCurrentPrice, tick, use_cache=use_cache, **options)
+        chains = [pool.submit(getOptionChainFrame, tick, expiration, key, debug=debug, **options)
+                  for expiration in expirations]
+        return [chain.result() for chain in chains], price.result()
+
+def downloadBars(ticker, start_date, end_date):
+    # Input: tick (or list of ticks for one batched request), first and last day
+    # Output: Daily bars from Yahoo Finance
+    import yfinance as yf # Only loaded when something actually has to be downloaded
+    return yf.download(ticker, start=start_date, end=end_date)
+
+def loadHistory(ticker, start_date):
+    # Input: tick, first day wanted (already normalized to midnight)
+    # Output: (bars, seconds since stored, first day the entry covers), all None when the cache can't answer
+    # Entries keep the first day that was requested rather than the first bar, since that bar is later whenever
+    # the requested day is a weekend or holiday.
+    entry, age = cache.load('history', ticker)
+    if entry is None:
+        return None, None, None
+    covered, bars = entry
+    if len(bars) == 0 or covered > start_date:
+        return None, None, None
+    return bars, age, covered
+
+def splitBars(bars, tickers):
+    # Input: Bars from downloadBars for one or many ticks, list of those ticks
+    # Output: Dictionary of tick -> bars with one column per field, the same shape whichever yfinance version
+    #         or request produced them, so cached entries from single and batched downloads can be mixed
+    panel = Volatility.toPanel(bars, tickers)
+    return {tick: pd.DataFrame({field: frame[tick] for field, frame in panel.items()}).dropna(how='all')
+            for tick in tickers}
+
+def getPriceHistory(ticker, start_date, end_date, use_cache=True):
+    # Input: tick, first and last day wanted, whether the on-disk cache may answer
+    # Output: Daily bars from yf.download between the two dates
+    # Purpose: Bars are kept in the cache, within the TTL nothing is downloaded and after it only the days
+    #          missing since the last cached bar are downloaded and appended.
+    start = pd.Timestamp(start_date).normalize()  # Bars are dated at midnight, the time of day doesn't matter
+    bars, age, covered = loadHistory(ticker, start) if use_cache else (None, None, None)
+    if bars is None:
+        cache.count(cache.misses, 'history')
+        # Nothing usable, full download
+        bars, covered = splitBars(downloadBars(ticker, start, end_date), [ticker])[ticker], start
+    elif age > cache.ttls['history']:
+        cache.count(cache.misses, 'history')
+        missingStart = bars.index[-1] + timedelta(days=1)
+        if missingStart < pd.Timestamp(end_date):
+            # Only the missing bars
+            newBars = splitBars(downloadBars(ticker, missingStart, end_date), [ticker])[ticker]
+            bars = pd.concat([bars, newBars])
+            bars = bars[~bars.index.duplicated(keep='last')]
+    else:
+        cache.count(cache.hits, 'history')
+        return bars[bars.index >= start]
+    if use_cache:
+        cache.set('history', ticker, (covered, bars))
+    return bars[bars.index >= start]
+
+def getHistoricalVolatility(ticker, days=30, estimator='close', window=None):
+    # Input: tick for tracking and 30 days since current attempt is looking at monthly history,
+    #        estimator from Volatility.ESTIMATORS and its rolling window in trading days (the whole history when None)
     # Output: produces a running average volatility estimate
     # For greeks calculation, the baseline requires a volatility estimate from stock history or calculating it from other values.
 
     end_date = datetime.now() # 30 days until today
     start_date = end_date - timedelta(days=days * 1.5)  # Provide some buffer for weekends and holidays
-    data = yf.download(ticker, start=start_date, end=end_date) # Downloads values from start date until today
+    with Instrument.stage('price_history', tick=ticker) as record:
+        data = getPriceHistory(ticker, start_date, end_date) # Values from start date until today
+        record['rows'] = len(data)
 
     # I would have used Finviz Instrumental API, but adj close is calculated already in Yahoo Finance
     if len(data) < days: #Error in case the market data is lost or not available
         raise ValueError(f"Not enough data for the last {days} trading days.")
 
-    # Calculation for close value change over each day
-    data['Return'] = data['Adj Close'].pct_change()
-    data.dropna(inplace=True)
-    dailyVolatility = data['Return'].std() # Standard deviation which shows volatility between changes
-    annualVolatility = dailyVolatility * np.sqrt(252)  # 252 trading days in a year
+    # Default 'close' is the standard deviation of the daily Adj Close change, annualized with 252 trading days
+    panel = Volatility.toPanel(data, [ticker])
+    return Volatility.estimateVolatility(panel, estimator, window)[ticker]
+
+def getPricePanel(tickers, days=30, use_cache=True):
+    # Input: List of ticks, trading days of history wanted, whether the on-disk cache may answer
+    # Output: Volatility panel (field -> DataFrame with one column per tick) of the daily bars
+    # Purpose: Ticks with fresh bars in the cache are served from it, the stale or missing ones come from one
+    #          batched yf.download and are written back to the cache per tick. Feed it to Volatility.volatilityTable
+    #          for every estimator at several windows.
+    tickers = list(tickers)
+    end_date = datetime.now()
+    start = pd.Timestamp(end_date - timedelta(days=days * 1.5)).normalize()
+    bars = {}
+    for tick in tickers:
+        cached, age, covered = loadHistory(tick, start) if use_cache else (None, None, None)
+        if cached is not None and age <= cache.ttls['history']:
+            cache.count(cache.hits, 'history')
+            bars[tick] = cached[cached.index >= start]
+        else:
+            cache.count(cache.misses, 'history')
+
+    stale = [tick for tick in tickers if tick not in bars]
+    if stale:
+        with Instrument.stage('price_history', tick=','.join(stale)) as record:
+            data = downloadBars(stale, start, end_date)
+            record['rows'] = len(data)
+        for tick, tickBars in splitBars(data, stale).items():
+            if use_cache and len(tickBars):
+                cache.set('history', tick, (start, tickBars))
+            bars[tick] = tickBars
+
+    panels = [Volatility.toPanel(bars[tick], [tick]) for tick in tickers if len(bars.get(tick, ()))]
+    if not panels:
+        return {field: pd.DataFrame(columns=tickers, dtype=float) for field in Volatility.FIELDS}
+    return {field: pd.concat([part[field] for part in panels], axis=1).reindex(columns=tickers)
+            for field in panels[0]}
 
-    return annualVolatility
+def getHistoricalVolatilities(tickers, days=30, estimator='close', window=None, use_cache=True):
+    # Input: List of ticks, the rest as in getHistoricalVolatility, whether the on-disk cache may answer
+    # Output: Series of tick -> volatility estimate, NaN where there is not enough history
+    # Purpose: One estimator at one window for a whole batch run, bars come from getPricePanel.
+    tickers = list(tickers)
+    panel = getPricePanel(tickers, days, use_cache)
+    if panel['Adj Close'].empty:
+        return pd.Series(float('nan'), index=tickers)
+    volatilities = Volatility.estimateVolatility(panel, estimator, window)
+    # Same rule as getHistoricalVolatility, a tick without enough history gets NaN instead of failing the batch
+    return volatilities.where(panel['Adj Close'].notna().sum() >= days)
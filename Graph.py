@@ -1,37 +1,35 @@
-import pandas as pd
 from matplotlib.dates import date2num, DateFormatter
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import GetInformation
-from datetime import datetime
+import Store
+import Indicators
 import os
 import matplotlib.pyplot as plt
 
-def createGraph(tick, numFridays):
+def loadCandles(tick, numFridays, incremental=False):
     # Input: Tick stock tracker, and next friday arrays
-    # Output: Graph with a unrefined candlestick, bollinger band, and SMA
-    # The goal is to produce a graph that shows the trend in the past contracts
+    #        incremental takes the bands from the saved Indicators state, only feeding it bars it hasn't seen
+    # Output: Aggregated candles with SMA and bollinger bands, indexed by date
+    #         Raises ValueError when nothing is stored for the tick, so exportGraphs reports it as failed
+    # Shared by createGraph and the headless exportGraphs
 
     # Get the next numFridays
     nextFridays = GetInformation.findNextFridays(numFridays)
 
-    # Convert nextFridays to strings using strftime
-    nextFridays_str = [date.strftime("%Y-%m-%d") if isinstance(date, datetime) else date for date in nextFridays]
-
-    # Generate file paths for the CSV files
-    file_paths = [os.path.join('data', f'{tick}_call_with_greeks_{date_str}.csv') for date_str in nextFridays_str]
+    # Latest snapshot of every expiration in next fridays, reading only the columns the chart uses
+    df = Store.loadSnapshots(tick, columns=['Type', 'Bid', 'Ask', 'Last Close', 'Last Trade'],
+                             expirations=nextFridays, latest=True)
+    if df.empty:
+        raise ValueError(f'No stored snapshots for {tick}, run fetch first')
+    df = df[df['Type'] == 'call'].copy() # Chart follows the call contracts
 
-    # Read and combine all CSV files on tick and in next fridays
-    dfs = []
-    for file_path in file_paths:
-        if os.path.exists(file_path):
-            df = pd.read_csv(file_path)
-            dfs.append(df)
-
-    # Combine all DataFrames into one
-    df = pd.concat(dfs, ignore_index=True)
-
-    # Convert 'Last Trade' to datetime and 'Last Close' to numeric
-    df['Date'] = pd.to_datetime(df['Last Trade'], format='%m/%d/%Y %I:%M:%S %p', errors='coerce') # Date along x axis
-    df['Close'] = pd.to_numeric(df['Last Close'], errors='coerce') # Last close baseline for y axis
+    # 'Last Trade' is stored as datetime and 'Last Close' as numeric
+    df['Date'] = df['Last Trade'] # Date along x axis
+    df['Close'] = df['Last Close'].astype(float) # Last close baseline for y axis
     df['Open'] = df[['Bid', 'Ask']].mean(axis=1) # Counter part to close for candle
     df['High'] = df[['Bid', 'Ask']].max(axis=1) # Wick above candle to show peak optimism
     df['Low'] = df[['Bid', 'Ask']].min(axis=1) # Wick below candle to show peak pessimism
@@ -51,23 +49,42 @@ def createGraph(tick, numFridays):
     df_agg.set_index('Date', inplace=True)
 
     # Calculate SMA and Bollinger Bands on aggregated data
-    df_agg['SMA'] = df_agg['Close'].rolling(window=20).mean()
-    df_agg['Rolling Std'] = df_agg['Close'].rolling(window=20).std()
-    df_agg['Upper Band'] = df_agg['SMA'] + (df_agg['Rolling Std'] * 2) # Two standard deviations from SMA above
-    df_agg['Lower Band'] = df_agg['SMA'] - (df_agg['Rolling Std'] * 2) # Two standard deviations from SMA below
+    if incremental:
+        Indicators.updateBands(tick, df_agg, window=20, width=2)  # Feeds only the bars the state hasn't seen
+        df_agg = df_agg.join(Indicators.loadBandValues(tick))
+    else:
+        df_agg['SMA'] = df_agg['Close'].rolling(window=20).mean()
+        df_agg['Rolling Std'] = df_agg['Close'].rolling(window=20).std()
+        df_agg['Upper Band'] = df_agg['SMA'] + (df_agg['Rolling Std'] * 2) # Two standard deviations from SMA above
+        df_agg['Lower Band'] = df_agg['SMA'] - (df_agg['Rolling Std'] * 2) # Two standard deviations from SMA below
 
     # Drop rows with NaN values in SMA or Bands
     df_agg.dropna(subset=['SMA', 'Upper Band', 'Lower Band'], inplace=True)
+    return df_agg
 
-    # Plot
-    fig, ax = plt.subplots(figsize=(14, 7))
+def drawGraph(ax, df_agg):
+    # Input: Axes to draw on and the candles from loadCandles
+    # Output: None, draws candlesticks, bollinger bands and SMA onto ax
+    # Every wick and every body go in as one collection each instead of one artist per candle.
 
     # Candlestick chart with adjusted width
     candle_width = 0.05  # Adjust this value to make candlesticks narrower or wider
-    for i in range(len(df_agg)): #Placing candle sticks individually
-        color = 'green' if df_agg['Close'].iloc[i] > df_agg['Open'].iloc[i] else 'red'
-        ax.plot([date2num(df_agg.index[i]), date2num(df_agg.index[i])], [df_agg['Low'].iloc[i], df_agg['High'].iloc[i]], color=color)
-        ax.add_patch(plt.Rectangle((date2num(df_agg.index[i]) - candle_width / 2, min(df_agg['Open'].iloc[i], df_agg['Close'].iloc[i])), candle_width, abs(df_agg['Close'].iloc[i] - df_agg['Open'].iloc[i]), color=color))
+    x = date2num(df_agg.index)
+    open_, close = df_agg['Open'].to_numpy(), df_agg['Close'].to_numpy()
+    colors = np.where(close > open_, 'green', 'red').tolist()
+
+    # Wicks, one (low, high) segment per candle
+    wicks = np.stack([np.column_stack([x, df_agg['Low'].to_numpy()]),
+                      np.column_stack([x, df_agg['High'].to_numpy()])], axis=1)
+    ax.add_collection(LineCollection(wicks, colors=colors))
+
+    # Bodies, one rectangle of four corners per candle from open to close
+    bottom, top = np.minimum(open_, close), np.maximum(open_, close)
+    left, right = x - candle_width / 2, x + candle_width / 2
+    bodies = np.stack([np.column_stack([left, bottom]), np.column_stack([left, top]),
+                       np.column_stack([right, top]), np.column_stack([right, bottom])], axis=1)
+    ax.add_collection(PolyCollection(bodies, facecolors=colors, edgecolors=colors))
+    ax.autoscale_view() # Collections don't update the axis limits on their own
 
     # Plot SMA
     ax.plot(df_agg.index, df_agg['SMA'], label='SMA', color='blue')
@@ -78,12 +95,59 @@ def createGraph(tick, numFridays):
 
     # Format x-axis for dates
     ax.xaxis.set_major_formatter(DateFormatter('%Y-%m-%d'))
-    plt.xticks(rotation=45)
+    ax.tick_params(axis='x', labelrotation=45)
 
     # Add legend and labels
-    plt.title('Candlestick Chart with Bollinger Bands and SMA')
-    plt.xlabel('Date')
-    plt.ylabel('Price')
-    plt.legend()
-    plt.tight_layout()
+    ax.set_title('Candlestick Chart with Bollinger Bands and SMA')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Price')
+    ax.legend()
+
+def createGraph(tick, numFridays, incremental=False):
+    # Input: Tick stock tracker, and next friday arrays, incremental as in loadCandles
+    # Output: Graph with a unrefined candlestick, bollinger band, and SMA
+    # The goal is to produce a graph that shows the trend in the past contracts
+    candles = loadCandles(tick, numFridays, incremental)  # Before the figure so a missing tick leaves no window
+    fig, ax = plt.subplots(figsize=(14, 7))
+    drawGraph(ax, candles)
+    fig.tight_layout()
     plt.show()
+
+# One figure per worker process, cleared and reused for every chart so rendering many doesn't leak memory
+figure = None
+
+def renderGraph(tick, numFridays, path, incremental=False):
+    # Input: Tick, next friday arrays and output file (the extension picks PNG or SVG)
+    # Output: (tick, path, error message or None)
+    # Draws straight onto an Agg canvas, no pyplot and no window, so it runs on a server.
+    global figure
+    try:
+        if figure is None:
+            figure = Figure(figsize=(14, 7))
+            FigureCanvasAgg(figure)
+        figure.clear()
+        drawGraph(figure.add_subplot(), loadCandles(tick, numFridays, incremental))
+        figure.tight_layout()
+        figure.savefig(path)
+        return tick, path, None
+    except Exception as e:
+        return tick, path, f'{type(e).__name__}: {e}'
+
+def exportGraphs(ticks, numFridays, out_dir=os.path.join('data', 'charts'), fmt='png', max_workers=None,
+                 incremental=False):
+    # Input: List of ticks, next friday arrays, output directory, 'png' or 'svg', number of processes,
+    #        incremental as in loadCandles
+    # Output: Dictionary of tick -> path of the chart, ticks that failed are printed and left out
+    # Purpose: Headless bulk chart export, charts are rendered in parallel across processes.
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        jobs = [pool.submit(renderGraph, tick, numFridays, os.path.join(out_dir, f'{tick}.{fmt}'), incremental)
+                for tick in ticks]
+        for job in jobs:
+            tick, path, error = job.result()
+            if error is None:
+                paths[tick] = path
+            else:
+                print(f'Chart for {tick} failed: {error}')
+    return paths
@@ -1,5 +1,8 @@
 import numpy as np
-from scipy.stats import norm
+from scipy.special import ndtr
+
+# The normal cdf is scipy.special.ndtr (what scipy.stats.norm.cdf calls underneath) and the pdf is normalPDF below,
+# so importing this module doesn't pull in all of scipy.stats.
 
 # Option Greeks refer to values that relate option relation to stock, inherent decline due to other variables.
 # Used values:
@@ -14,7 +17,7 @@ def BS_CALL(S, K, T, r, sigma):
     # Used to create a baseline market price and also used in Sigma to regress towards calculated volatility.
     d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
     d2 = d1 - sigma * np.sqrt(T)
-    callPrice = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+    callPrice = S * ndtr(d1) - K * np.exp(-r * T) * ndtr(d2)
     # Using CDF to calculate market price according to Black-Scholes formula
     return callPrice
 
@@ -24,7 +27,7 @@ def BS_PUT(S, K, T, r, sigma):
     # Used to create a baseline market price and also used in Sigma to regress towards calculated volatility.
     d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
     d2 = d1 - sigma * np.sqrt(T)
-    putPrice = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
+    putPrice = K * np.exp(-r * T) * ndtr(-d2) - S * ndtr(-d1)
     # Using CDF to calculate market price according to Black-Scholes formula
     return putPrice
 
@@ -37,7 +40,7 @@ def sigmaCall(callMarket, S, K, T, r, historical_volatility, tol, max_iterations
     for i in range(max_iterations):
         call = BS_CALL(S, K, T, r, sigma)
         d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-        vega = S * norm.pdf(d1) * np.sqrt(T)  # Vega calculation
+        vega = S * normalPDF(d1) * np.sqrt(T)  # Vega calculation
         price_diff = call - callMarket  # Difference between market price and model price
         if abs(price_diff) < tol:
             return sigma
@@ -52,7 +55,7 @@ def sigmaPut(putMarket, S, K, T, r, historical_volatility, tol, max_iterations):
     for i in range(max_iterations):
         put = BS_PUT(S, K, T, r, sigma)
         d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-        vega = S * norm.pdf(d1) * np.sqrt(T)  # Vega calculation
+        vega = S * normalPDF(d1) * np.sqrt(T)  # Vega calculation
         price_diff = put - putMarket  # Difference between market price and model price
         if abs(price_diff) < tol:
             return sigma
@@ -68,10 +71,10 @@ def calculateDelta(stock_price, strike_price, risk_free_rate, time_to_expiration
 
     if option_type.lower() == 'call':
         # Delta for call option
-        delta = norm.cdf(d1)
+        delta = ndtr(d1)
     elif option_type.lower() == 'put':
         # Delta for put option
-        delta = norm.cdf(d1) - 1
+        delta = ndtr(d1) - 1
     else:
         raise ValueError("Invalid option type. Use 'call' or 'put'.")
 
@@ -86,6 +89,158 @@ def calculateVega(stock_price, strike_price, risk_free_rate, time_to_expiration,
             volatility * np.sqrt(time_to_expiration))
 
     # Calculate vega
-    vega = stock_price * np.sqrt(time_to_expiration) * norm.pdf(d1)
+    vega = stock_price * np.sqrt(time_to_expiration) * normalPDF(d1)
+
+    return vega
+
+# Whole chain functions, these take NumPy arrays of strikes and expiries and price calls and puts in one pass.
+# Same formulas as above. isCall is a boolean array (True for calls, False for puts).
+def calculateD1(S, K, T, r, sigma):
+    # Input (in order): Stock price, Strike prices, Until Maturity, Lending rate, Volatility (scalars or arrays)
+    # Output: d1 and d2 arrays from Black-Scholes
+    # Shared by every chain function so d1 is written down once.
+    S, K, T, sigma = (np.asarray(x, dtype=float) for x in (S, K, T, sigma))
+    sigmaRootT = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / sigmaRootT
+    d2 = d1 - sigmaRootT
+    return d1, d2
+
+def normalPDF(x):
+    # Input: array of values
+    # Output: Standard normal density, same values as norm.pdf without the scipy.stats wrapper
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+def BS_CHAIN(S, K, T, r, sigma, isCall):
+    # Input (in order): Stock price, Strike prices, Until Maturity, Lending rate, Volatility, Call mask
+    # Output: Market price array, calls priced as BS_CALL and puts priced as BS_PUT
+    # Used in createOptionsFile so the whole chain is priced at once instead of row by row.
+    d1, d2 = calculateD1(S, K, T, r, sigma)
+    return priceFromD1(S, K * np.exp(-r * np.asarray(T, dtype=float)), d1, d2, isCall)
+
+def priceFromD1(S, discountedStrike, d1, d2, isCall):
+    # Input: Stock price, Strike prices times the discount factor, d1 and d2 already computed, Call mask
+    # Output: Market price array, lets callers that already have d1 and d2 skip recomputing them
+    callPrice = S * ndtr(d1) - discountedStrike * ndtr(d2)
+    putPrice = discountedStrike * ndtr(-d2) - S * ndtr(-d1)
+    return np.where(isCall, callPrice, putPrice)
+
+def guessImpliedVolatility(marketPrice, S, K, T, r, isCall):
+    # Input (in order): Market prices, Stock price, Strike prices, Until Maturity, Lending rate, Call mask
+    # Output: Closed form starting volatility for every contract
+    # Corrado-Miller approximation, puts are turned into calls with put-call parity first.
+    # This lands close to the answer so Newton only needs a few steps instead of starting from historical volatility.
+    marketPrice, K, T = (np.asarray(x, dtype=float) for x in (marketPrice, K, T))
+    discountedStrike = K * np.exp(-r * T)
+    callPrice = np.where(isCall, marketPrice, marketPrice + S - discountedStrike)
+    halfGap = (S - discountedStrike) / 2
+    root = np.sqrt(np.maximum((callPrice - halfGap) ** 2 - (S - discountedStrike) ** 2 / np.pi, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        guess = np.sqrt(2 * np.pi / T) / (S + discountedStrike) * (callPrice - halfGap + root)
+    return guess
+
+def impliedVolatilityChain(marketPrice, S, K, T, r, isCall, tol=1e-8, max_iterations=100, lower=1e-4, upper=10.0,
+                           priceFunction=None):
+    # Input (in order): Market prices, Stock price, Strike prices, Until Maturity, Lending rate, Call mask,
+    #                   Tolerance, Max iterations, Volatility bracket,
+    #                   American pricing function with BS_CHAIN's arguments (e.g. American.bawPrice), European when None
+    # Output: (Implied volatility, iterations used, converged) arrays, one entry per contract
+    # Newton-Raphson over the whole chain at once. Only contracts that have not converged are iterated, and every
+    # contract keeps a [low, high] bracket so when vega is near zero or Newton jumps outside it we bisect instead.
+    # Prices within tol of the lower no-arbitrage bound (deep in the money, no time value left) are solved at the
+    # lower end of the bracket and count as converged. Prices outside the bounds have no implied volatility and
+    # come back as NaN, not converged. A price the bracket can't reach stops at lower or upper, not converged.
+    # With a priceFunction the Newton slope is a forward difference of that function instead of the vega formula.
+    marketPrice, S, K, T, isCall = np.broadcast_arrays(np.asarray(marketPrice, dtype=float), np.asarray(S, dtype=float),
+                                                       np.asarray(K, dtype=float), np.asarray(T, dtype=float),
+                                                       np.asarray(isCall, dtype=bool))
+    discountedStrike = K * np.exp(-r * T)
+    lowerBound = np.where(isCall, np.maximum(S - discountedStrike, 0.0), np.maximum(discountedStrike - S, 0.0))
+    upperBound = np.where(isCall, S, discountedStrike)
+    if priceFunction is not None:  # An American put can be exercised now, it is worth between K - S and K
+        lowerBound = np.where(isCall, lowerBound, np.maximum(K - S, 0.0))
+        upperBound = np.where(isCall, upperBound, K)
+    atLowerBound = (T > 0) & (np.abs(marketPrice - lowerBound) <= tol)
+    solvable = (T > 0) & (marketPrice - lowerBound > tol) & (marketPrice < upperBound)
+
+    sigma = np.full(marketPrice.shape, np.nan)
+    iterations = np.zeros(marketPrice.shape, dtype=int)
+    converged = np.zeros(marketPrice.shape, dtype=bool)
+    sigma[atLowerBound] = lower
+    converged[atLowerBound] = True
+
+    guess = guessImpliedVolatility(marketPrice, S, K, T, r, isCall)
+    guess = np.where(np.isfinite(guess), guess, 0.5)
+    sigma[solvable] = np.clip(guess[solvable], lower * 2, upper / 2)
+    low = np.full(marketPrice.shape, lower)
+    high = np.full(marketPrice.shape, upper)
+
+    active = np.flatnonzero(solvable)  # Indexes of contracts still being solved
+    for i in range(max_iterations):
+        if active.size == 0:
+            break
+        s, spot, k, t, call = sigma[active], S[active], K[active], T[active], isCall[active]
+        if priceFunction is None:
+            d1, d2 = calculateD1(spot, k, t, r, s)  # d1 and d2 are shared by the price and vega
+            vega = spot * np.sqrt(t) * normalPDF(d1)
+            price_diff = priceFromD1(spot, discountedStrike[active], d1, d2, call) - marketPrice[active]
+        else:
+            price = priceFunction(spot, k, t, r, s, call)
+            vega = (priceFunction(spot, k, t, r, s * (1 + 1e-6), call) - price) / (s * 1e-6)  # Forward difference
+            price_diff = price - marketPrice[active]
+        iterations[active] += 1
+
+        done = np.abs(price_diff) < tol
+        converged[active[done]] = True
+
+        # Price rises with volatility, so the sign of the miss tells which side of the bracket to move
+        high[active] = np.where(price_diff > 0, s, high[active])
+        low[active] = np.where(price_diff < 0, s, low[active])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = s - price_diff / vega  # Newton-Raphson step
+        inside = np.isfinite(newton) & (newton > low[active]) & (newton < high[active])
+        sigma[active] = np.where(done, s, np.where(inside, newton, 0.5 * (low[active] + high[active])))
+
+        # A bracket narrower than the tolerance cannot improve any further. It only holds the answer when both ends
+        # moved off the limits, one collapsed against lower or upper means the price is out of the bracket's reach.
+        collapsed = ~done & (high[active] - low[active] < tol)
+        converged[active[collapsed & (low[active] > lower) & (high[active] < upper)]] = True
+        active = active[~(done | collapsed)]
+    return sigma, iterations, converged
+
+# Every Greek calculateGreeksChain knows how to emit
+ALL_GREEKS = ('Delta', 'Gamma', 'Vega', 'Theta', 'Rho', 'Vanna', 'Volga')
+
+def calculateGreeksChain(S, K, T, r, sigma, isCall, greeks=ALL_GREEKS):
+    # Input (in order): Stock price, Strike prices, Until Maturity, Lending rate, Volatility, Call mask, Greeks wanted
+    # Output: Dictionary of Greek name -> array, only for the names in greeks
+    # d1, d2, pdf(d1), cdf(+-d1/d2) and the discount factor are computed once per contract and every Greek is
+    # derived from them. Theta and Rho are per year and per 1.00 of rate, Vega, Vanna and Volga per 1.00 of volatility.
+    # Gamma: delta increase when stock increases by $1
+    # Theta: price decay as time passes
+    # Rho: price increase when the lending rate increases
+    # Vanna: delta increase when volatility increases
+    # Volga: vega increase when volatility increases
+    unknown = set(greeks) - set(ALL_GREEKS)
+    if unknown:
+        raise ValueError(f"Unknown Greeks {sorted(unknown)}. Use any of {', '.join(ALL_GREEKS)}.")
+
+    S, K, T, sigma = (np.asarray(x, dtype=float) for x in (S, K, T, sigma))
+    rootT = np.sqrt(T)
+    d1, d2 = calculateD1(S, K, T, r, sigma)
+    pdf = normalPDF(d1)
+    cdfD1 = ndtr(d1)
+    cdfD2 = np.where(isCall, ndtr(d2), -ndtr(-d2))  # N(d2) for calls, -N(-d2) for puts
+    discountedStrike = K * np.exp(-r * T)
+    vega = S * rootT * pdf
 
-    return vega
\ No newline at end of file
+    formulas = {
+        'Delta': lambda: cdfD1 - np.where(isCall, 0.0, 1.0),
+        'Gamma': lambda: pdf / (S * sigma * rootT),
+        'Vega': lambda: vega,
+        'Theta': lambda: -S * pdf * sigma / (2 * rootT) - r * discountedStrike * cdfD2,
+        'Rho': lambda: discountedStrike * T * cdfD2,
+        'Vanna': lambda: -pdf * d2 / sigma,
+        'Volga': lambda: vega * d1 * d2 / sigma,
+    }
+    return {name: formulas[name]() for name in greeks}
@@ -0,0 +1,114 @@
+import math
+import os
+import pickle
+from collections import deque
+import pandas as pd
+import Cache
+
+# Incremental SMA and bollinger bands, kept per tick on disk so each new bar costs O(1) instead of re-running
+# pandas rolling over the whole history. Results match Close.rolling(window).mean() and .std() (ddof=1).
+# The saved state is only the window and its running sums, so it stays the same size however long the history.
+# Band values already produced are appended to data/indicators/<tick>_bands.csv, only the new rows are written.
+INDICATOR_DIR = os.path.join('data', 'indicators')
+RESYNC_EVERY = 1000  # Running sums are rebuilt from the window this often so float error can't build up
+BAND_COLUMNS = ['SMA', 'Rolling Std', 'Upper Band', 'Lower Band']
+
+
+class RollingBands:
+    # Rolling state for one tick: the last `window` closes, their running sum and sum of squares and the last bar
+    # date. Sums are taken around the first close seen (shift) which keeps the sum of squares from losing precision
+    # when prices are large compared to their spread.
+
+    def __init__(self, window=20, width=2):
+        self.window = window
+        self.width = width  # Standard deviations from SMA to each band
+        self.buffer = deque(maxlen=window)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.shift = None
+        self.updates = 0
+        self.last_date = None
+
+    def update(self, date, close):
+        # Input: Bar date and close, bars must arrive in date order and close can't be NaN
+        # Output: (SMA, Rolling Std, Upper Band, Lower Band), NaN until the window is full
+        if self.shift is None:
+            self.shift = close
+        value = close - self.shift
+        if len(self.buffer) == self.window:  # Oldest close leaves the window
+            oldest = self.buffer[0]
+            self.total -= oldest
+            self.total_sq -= oldest * oldest
+        self.buffer.append(value)
+        self.total += value
+        self.total_sq += value * value
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self.total = math.fsum(self.buffer)
+            self.total_sq = math.fsum(v * v for v in self.buffer)
+        self.last_date = date
+
+        if len(self.buffer) < self.window:
+            bands = (math.nan,) * 4
+        else:
+            n = self.window
+            mean = self.total / n
+            variance = max((self.total_sq - self.total * mean) / (n - 1), 0.0)
+            std = math.sqrt(variance)
+            sma = mean + self.shift
+            bands = (sma, std, sma + std * self.width, sma - std * self.width)
+        return bands
+
+
+def loadBands(tick, window=20, width=2, root=INDICATOR_DIR):
+    # Input: Tick, window and band width, directory of the saved states
+    # Output: Saved RollingBands for the tick, or a new one if none was saved with the same window and width
+    try:
+        with open(os.path.join(root, f'{tick}.pkl'), 'rb') as file:
+            bands = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return RollingBands(window, width)
+    if bands.window != window or bands.width != width:
+        return RollingBands(window, width)
+    return bands
+
+def saveBands(tick, bands, root=INDICATOR_DIR):
+    Cache.atomicWrite(os.path.join(root, f'{tick}.pkl'), pickle.dumps(bands))
+
+def appendBandValues(tick, values, root=INDICATOR_DIR):
+    # Input: Tick, band values of new bars indexed by date, state directory
+    # Output: None, the rows are appended to <tick>_bands.csv (header only when the file is new)
+    path = os.path.join(root, f'{tick}_bands.csv')
+    os.makedirs(root, exist_ok=True)
+    values.to_csv(path, mode='a', header=not os.path.exists(path), index_label='Date')
+
+def loadBandValues(tick, root=INDICATOR_DIR):
+    # Input: Tick, state directory
+    # Output: Every band value appended so far indexed by date, empty if there are none
+    try:
+        values = pd.read_csv(os.path.join(root, f'{tick}_bands.csv'), index_col='Date', parse_dates=['Date'])
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        return pd.DataFrame(columns=BAND_COLUMNS, dtype=float)
+    return values[~values.index.duplicated(keep='last')]  # A run stopped before saveBands appends its bars twice
+
+def updateBands(tick, candles, window=20, width=2, root=INDICATOR_DIR):
+    # Input: Tick, candles indexed by date with a Close column, window, band width and state directory
+    # Output: DataFrame of SMA, Rolling Std, Upper Band and Lower Band for only the bars fed in this call
+    # Purpose: Only candles newer than the last saved bar are fed in, everything earlier comes from the saved state.
+    #          Bars dated at or before the last saved bar are assumed unchanged. The new values are appended to the
+    #          tick's band file and loadBandValues reads back the whole series.
+    bands = loadBands(tick, window, width, root)
+    if bands.last_date is not None:
+        candles = candles[candles.index > bands.last_date]
+    values = pd.DataFrame([bands.update(date, close) for date, close in
+                           zip(candles.index, candles['Close'].to_numpy(dtype=float))],
+                          index=candles.index, columns=BAND_COLUMNS, dtype=float)
+    if len(candles):
+        if bands.updates == len(candles):  # State started over (new tick or new window/width), so does the file
+            try:
+                os.remove(os.path.join(root, f'{tick}_bands.csv'))
+            except FileNotFoundError:
+                pass
+        appendBandValues(tick, values, root)
+        saveBands(tick, bands, root)
+    return values
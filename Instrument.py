@@ -0,0 +1,146 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Lightweight per-stage instrumentation for the options pipeline.
+# Wrap a stage in `with Instrument.stage('download', tick=tick, expiration=e) as record:` and put counters on the
+# record (record['bytes'] = n). Every finished stage is logged as one JSON line on the 'options.instrument' logger
+# and kept for summary(). When instrumentation is off, stage() hands back a throwaway dict and records nothing,
+# so the cost is one function call and a flag check.
+logger = logging.getLogger('options.instrument')
+enabled = False
+profiling = False
+records = []
+lock = threading.Lock()  # Stages finish on the download threads too
+
+
+def enable(profile=False, log_file=None):
+    # Input: Whether profiled() sections dump cProfile output, optional file for the JSON records
+    # Output: The log handler added for log_file, or None
+    global enabled, profiling
+    enabled = True
+    profiling = profile
+    if log_file is None:
+        return None
+    handler = logging.FileHandler(log_file)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return handler
+
+def disable():
+    global enabled, profiling
+    enabled = profiling = False
+
+def reset():
+    with lock:
+        records.clear()
+
+@contextmanager
+def session(profile=False, log_file=None):
+    # Input: Same as enable
+    # Enables instrumentation with empty records for the duration of one run, then restores whatever was enabled
+    # before and closes the log file handler it added, even when the run raises
+    global enabled, profiling
+    previous = enabled, profiling
+    handler = enable(profile, log_file)
+    reset()
+    try:
+        yield
+    finally:
+        enabled, profiling = previous
+        if handler is not None:
+            logger.removeHandler(handler)
+            handler.close()
+
+@contextmanager
+def timedStage(name, labels):
+    record = {'stage': name, **labels}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        with lock:
+            records.append(record)
+        logger.info(json.dumps(record, default=str))
+
+def stage(name, **labels):
+    # Input: Stage name and labels (tick, expiration, ...)
+    # Output: Context manager yielding the record dict to add counters to
+    if not enabled:
+        return NULL_STAGE
+    return timedStage(name, labels)
+
+def event(name, **values):
+    # Records a single measurement that has no duration, like the cache hit/miss counts at the end of a run
+    if enabled:
+        record = {'stage': name, **values}
+        with lock:
+            records.append(record)
+        logger.info(json.dumps(record, default=str))
+
+def summary():
+    # Output: {stage: {'count', 'seconds', 'max_seconds', and the sum of every numeric counter}}
+    totals = {}
+    with lock:
+        finished = list(records)
+    for record in finished:
+        total = totals.setdefault(record['stage'], {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+        total['count'] += 1
+        total['seconds'] += record.get('seconds', 0.0)
+        total['max_seconds'] = max(total['max_seconds'], record.get('seconds', 0.0))
+        for key, value in record.items():
+            if key not in ('stage', 'seconds') and isinstance(value, (int, float)) and not isinstance(value, bool):
+                total[key] = total.get(key, 0) + value
+    return totals
+
+def printSummary():
+    # Prints summary() as a table, slowest stage first
+    totals = summary()
+    if not totals:
+        return
+    print(f'{"stage":24s} {"count":>6s} {"total s":>9s} {"max s":>9s}  counters')
+    for name, total in sorted(totals.items(), key=lambda item: -item[1]['seconds']):
+        counters = ', '.join(f'{key}={value:g}' for key, value in total.items()
+                             if key not in ('count', 'seconds', 'max_seconds'))
+        print(f'{name:24s} {total["count"]:6d} {total["seconds"]:9.3f} {total["max_seconds"]:9.3f}  {counters}')
+
+@contextmanager
+def profiled(name, directory='data'):
+    # Input: Section name and where the .prof file goes
+    # Runs the section under cProfile when profiling is on, dumps data/profile_<name>.prof and prints the top 20
+    # functions by cumulative time. Does nothing otherwise.
+    if not profiling:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'profile_{name}.prof')
+        profiler.dump_stats(path)
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(20)
+        print(f'Profile of {name} saved to {path}\n{output.getvalue()}')
+
+
+class NullStage:
+    # What stage() returns when instrumentation is off, reusable and stateless
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_STAGE = NullStage()
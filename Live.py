@@ -0,0 +1,129 @@
+import asyncio
+import inspect
+import time
+import numpy as np
+import pandas as pd
+import GetInformation
+import Main
+
+# Live polling mode: polls the spot quote and every expiration's export on a schedule and diffs each new chain
+# against the previous snapshot by contract (Type, Strike). Only contracts whose bid/ask/last changed are repriced,
+# everything else keeps its cached results, unless the spot or time to maturity moved which touches every contract.
+KEY_COLUMNS = ['Type', 'Strike']
+INPUT_COLUMNS = ['Bid', 'Ask', 'Last Close']
+
+
+def changedRows(new, old):
+    # Input: New contracts and previous results, both indexed by KEY_COLUMNS
+    # Output: Boolean array over new, True where the contract is new or an input column changed
+    old = old.reindex(new.index)
+    same = np.ones(len(new), dtype=bool)
+    for column in INPUT_COLUMNS:
+        a, b = new[column], old[column]
+        same &= ((a == b) | (a.isna() & b.isna())).to_numpy()
+    return ~same
+
+
+class LivePoller:
+    # Long running asyncio loop for one tick. Every update is published as a dictionary with tick, expiration,
+    # spot, the full priced chain and how many contracts were repriced, either to an asyncio.Queue or a callback
+    # (plain function or coroutine).
+
+    def __init__(self, tick, finvizKey, fedKey, numFridays, interval=60, publish=None, greeks=('Delta', 'Vega'),
+                 maxWorkers=8, requestsPerSecond=5, exercise='european'):
+        self.tick = tick
+        self.finvizKey = finvizKey
+        self.fedKey = fedKey
+        self.numFridays = numFridays
+        self.interval = interval  # Seconds between polls
+        self.publish = publish
+        self.greeks = greeks
+        self.maxWorkers = maxWorkers
+        self.requestsPerSecond = requestsPerSecond
+        self.exercise = exercise  # 'european' or 'american', see Main.priceChain
+        self.previous = {}  # expiration -> last priced chain indexed by KEY_COLUMNS
+        self.previousInputs = {}  # expiration -> (spot, until maturity) it was priced with
+        self.fedRate = None
+        self.historicalVolatility = None
+
+    def update(self, expiration, contracts, stockPrice, untilMaturity):
+        # Input: Expiration string, freshly parsed contracts, Stock price and Until Maturity
+        # Output: (priced chain, number of contracts repriced)
+        new = contracts.dropna().drop_duplicates(KEY_COLUMNS, keep='last').set_index(KEY_COLUMNS)
+        old = self.previous.get(expiration)
+        if old is None or self.previousInputs.get(expiration) != (stockPrice, untilMaturity):
+            changed = np.ones(len(new), dtype=bool)  # Spot or maturity moved, every contract is affected
+        else:
+            changed = changedRows(new, old)
+
+        if changed.all():
+            chain = self.price(new, stockPrice, untilMaturity)
+        else:
+            parts = [old.reindex(new.index[~changed])]
+            if changed.any():
+                parts.append(self.price(new[changed], stockPrice, untilMaturity))
+            chain = pd.concat(parts).reindex(new.index)
+            chain[new.columns] = new  # Latest inputs (e.g. Last Trade) even where the results are reused
+
+        self.previous[expiration] = chain
+        self.previousInputs[expiration] = (stockPrice, untilMaturity)
+        return chain, int(changed.sum())
+
+    def price(self, contracts, stockPrice, untilMaturity):
+        chain, iterations, converged = Main.priceChain(contracts.reset_index(), stockPrice, untilMaturity, self.fedRate,
+                                                       self.historicalVolatility, self.greeks,
+                                                       exercise=self.exercise)
+        return chain.set_index(KEY_COLUMNS)
+
+    async def send(self, update):
+        if isinstance(self.publish, asyncio.Queue):
+            await self.publish.put(update)
+        elif self.publish is not None:
+            result = self.publish(update)
+            if inspect.isawaitable(result):
+                await result
+
+    async def poll(self):
+        # One cycle: downloads run in a thread so the event loop stays free, then every expiration is diffed,
+        # repriced where needed and published
+        nextFridays = GetInformation.findNextFridays(self.numFridays)
+        chains, stockPrice = await asyncio.to_thread(
+            GetInformation.fetchOptionChains, self.tick, nextFridays, self.finvizKey, max_workers=self.maxWorkers,
+            requests_per_second=self.requestsPerSecond, use_cache=False)
+        stockPrice = float(stockPrice)
+        for expiration, contracts in zip(nextFridays, chains):
+            untilMaturity = GetInformation.getDaysUntil(expiration) / 365
+            chain, repriced = self.update(expiration, contracts, stockPrice, untilMaturity)
+            await self.send({'tick': self.tick, 'expiration': expiration, 'spot': stockPrice,
+                             'chain': chain.reset_index(), 'repriced': repriced, 'contracts': len(chain)})
+
+        # Expirations that rolled off are forgotten
+        for expiration in set(self.previous) - set(nextFridays):
+            del self.previous[expiration]
+            self.previousInputs.pop(expiration, None)
+
+    async def run(self, cycles=None):
+        # Input: Number of polls to run, forever when None
+        # Fed funds rate and historical volatility only change daily, so they are fetched once up front.
+        self.historicalVolatility = float(await asyncio.to_thread(GetInformation.getHistoricalVolatility, self.tick))
+        self.fedRate = float(await asyncio.to_thread(GetInformation.getFedFundsRate, self.fedKey))
+        cycle = 0
+        while cycles is None or cycle < cycles:
+            start = time.monotonic()
+            try:
+                await self.poll()
+            except Exception as e:  # A failed poll is reported and retried next interval, not fatal
+                print(f'Poll for {self.tick} failed: {type(e).__name__}: {e}')
+            cycle += 1
+            if cycles is None or cycle < cycles:
+                await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+
+
+def runLive(tick, finvizKey, fedKey, numFridays, interval=60, publish=None, **options):
+    # Input: Same as LivePoller, blocks and polls until interrupted
+    # Output: None
+    # Purpose: Entry point for scripts, prints a line per update when no publish target is given.
+    if publish is None:
+        publish = lambda update: print(f"{update['tick']} {update['expiration']}: repriced "
+                                       f"{update['repriced']}/{update['contracts']} at spot {update['spot']}")
+    asyncio.run(LivePoller(tick, finvizKey, fedKey, numFridays, interval, publish, **options).run())
@@ -1,73 +1,103 @@
 import pandas as pd
+import numpy as np
+import argparse
+import configparser
+import contextlib
 import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import GetInformation
 import Greeks
-import Graph
-from datetime import datetime
+import Store
+import Surface
+import Instrument
+import Volatility
+import American
+from datetime import datetime, timezone
+
+def priceChain(contracts, stockPrice, untilMaturity, fedRate, historicalVolatility, greeks=('Delta', 'Vega'),
+               tolerance=1e-8, maxIter=100, expiration=None, exercise='european'):
+    # Input: Parsed contracts of one expiration, Stock price, Until Maturity, Lending rate, historical volatility,
+    #        Greek columns to emit, Sigma tolerance and max iterations, expiration (only labels instrumentation),
+    #        exercise style, 'european' (Black-Scholes) or 'american' (Barone-Adesi-Whaley, see American)
+    # Output: (chain with StockPrice, ImpliedVolatility and Greek columns, IV iterations, IV converged)
+    # Purpose: Shared by createOptionsFile and the Live poller.
+
+    if exercise not in American.PRICERS:
+        raise ValueError(f"Unknown exercise style {exercise}. Use any of {', '.join(American.PRICERS)}.")
+    priceFunction, impliedVolatilityFunction, greeksFunction = American.PRICERS[exercise]
+
+    # Calls and puts are priced together in one broadcast pass, isCall marks which rows are calls
+    chain = contracts.reset_index(drop=True)
+    isCall = (chain['Type'] == 'call').to_numpy()
+    strikes = chain['Strike'].to_numpy(dtype=float)
+    chain['StockPrice'] = priceFunction(stockPrice, strikes, untilMaturity, fedRate, historicalVolatility, isCall)
+
+    # Proceed with calculations if DataFrames are not empty after filtering
+    if chain.empty:
+        return chain, np.zeros(0, dtype=int), np.zeros(0, dtype=bool)
+
+    # Add Greeks and perform calculations
+    with Instrument.stage('implied_volatility', expiration=expiration, rows=len(chain)) as record:
+        impliedVolatility, iterations, converged = impliedVolatilityFunction(
+            chain['StockPrice'].to_numpy(dtype=float), stockPrice, strikes, untilMaturity, fedRate, isCall,
+            tolerance, maxIter)
+        record['iv_iterations'] = int(iterations.sum())
+        record['iv_unconverged'] = int((~converged).sum())
+    chain['ImpliedVolatility'] = impliedVolatility
+    with Instrument.stage('greeks', expiration=expiration, rows=len(chain)):
+        for name, values in greeksFunction(stockPrice, strikes, untilMaturity, fedRate, impliedVolatility, isCall,
+                                           greeks).items():
+            chain[name] = values
+    return chain, iterations, converged
+
+def writeChainFiles(tick, expiration, chain):
+    # Input: Tick, expiration string, priced chain
+    # Output: Writes <tick>_call_with_greeks_<date>.csv and the put counterpart to data
+    os.makedirs('data', exist_ok=True)
+    isCall = (chain['Type'] == 'call').to_numpy()
+    for type_name, mask in (('call', isCall), ('put', ~isCall)):
+        if mask.any():
+            output_file = os.path.join('data', f'{tick}_{type_name}_with_greeks_{expiration}.csv')
+            chain[mask].to_csv(output_file, index=False)
+        else:
+            print(f"No valid {type_name} options to process.")
 
 # Simplifies the create optionsFile
-def createOptionsFile(tick, finvizKey, fedKey, numFridays):
+def createOptionsFile(tick, finvizKey, fedKey, numFridays, maxWorkers=8, requestsPerSecond=5, fedRate=None,
+                      debug=False, greeks=('Delta', 'Vega'), surface=False, instrument=False, profile=False,
+                      historicalVolatility=None, volEstimator='close', volWindow=None, exercise='european'):
     # Input: Tick, Finviz Key, Saint Louis Federal Bank APi Key, and Number of fridays to record
+    #        Optional download concurrency cap, Finviz rate limit and an already fetched fed funds rate
+    #        and historical volatility
+    #        volEstimator and volWindow pick the historical volatility estimator (see Volatility.ESTIMATORS)
+    #        exercise prices as 'european' or 'american' options (see priceChain)
+    #        debug also writes the raw Finviz exports and the separated call/put files to data
+    #        greeks picks the Greek columns to emit, any of Greeks.ALL_GREEKS
+    #        surface also fits an implied volatility surface across every expiration and saves it to data
+    #        instrument times every stage (see Instrument) and prints a summary, profile also dumps cProfile
+    #        output for the pricing loop
     # Output: Downloads NumFridays # of csvs with greeks applied.
     # Purpose to create a viable storage for values to be visualized.
 
-    tolerance = 1e-8 #Sigma tolerance for model difference
-    maxIter = 1000 #Sigma max iterations
-    historicalVolatility = GetInformation.getHistoricalVolatility(tick) # model volatility before sigma
-    fedRate = GetInformation.getFedFundsRate(fedKey)  # Rate according to Saint Louis Federal Bank
-    stockPrice = GetInformation.getCurrentPrice(tick)  # Get current price from Finviz Instrument API
-    nextFridays = GetInformation.findNextFridays(numFridays)  # Array of Date-Time Objects
-
-    # Arrays to accept once the the loops run
-    paths = []
-    expirations = []
-
-    for i in range(numFridays):
-        runningFriday = nextFridays[i]
-        if isinstance(runningFriday, str):  # Ensure runningFriday is a datetime object
-            runningFriday = datetime.strptime(runningFriday, "%Y-%m-%d")
-
-        daysUntil = GetInformation.getDaysUntil(runningFriday)
-        untilMaturity = daysUntil / 365  # Until Maturity for calculation
-        expirations.append(untilMaturity) # Gets all the expirations
-
-        pathToFile = GetInformation.getOptionChains(tick, runningFriday,
-                                                    finvizKey)  # Downloads the export, returns the path
-        paths.append(pathToFile)
-
-        # Confirm file path
-        print(f'File saved to: {pathToFile}')
-
-        contracts = pd.read_csv(pathToFile)
-        grouped = contracts.groupby('Type')
-
-        # Separates into calls and puts.
-        for type_name, group in grouped:
-            output_file = os.path.join('data', f'{type_name}_{runningFriday.strftime("%Y-%m-%d")}.csv')
-            group.to_csv(output_file, index=False)
-            print(f'Saved {type_name} data to {output_file}')
-
-        # Construct file paths for reading
-        call_file = os.path.join('data', f'call_{runningFriday.strftime("%Y-%m-%d")}.csv')
-        put_file = os.path.join('data', f'put_{runningFriday.strftime("%Y-%m-%d")}.csv')
-        print(f'Reading files: {call_file}, {put_file}')
-
-        # Check if the files exist before reading
-        if os.path.exists(call_file):
-            call = pd.read_csv(call_file)
-        else:
-            print(f'File not found: {call_file}')
-            call = pd.DataFrame()  # Create an empty DataFrame to avoid further errors
-
-        if os.path.exists(put_file):
-            put = pd.read_csv(put_file)
-        else:
-            print(f'File not found: {put_file}')
-            put = pd.DataFrame()  # Create an empty DataFrame to avoid further errors
+    # Records start empty for this run and the previous instrumentation state comes back afterwards, so a worker
+    # process reused for the next ticker neither keeps instrumenting nor adds this run to its summary
+    GetInformation.cache.resetStats()  # Cache hits/misses below are for this run only, same reason
+    with Instrument.session(profile) if instrument or profile else contextlib.nullcontext():
+        tolerance = 1e-8 #Sigma tolerance for model difference
+        maxIter = 100 #Sigma max iterations, the chain solver converges in a handful
+        if historicalVolatility is None:
+            # model volatility before sigma
+            historicalVolatility = GetInformation.getHistoricalVolatility(tick, estimator=volEstimator, window=volWindow)
+        if fedRate is None:
+            fedRate = GetInformation.getFedFundsRate(fedKey)  # Rate according to Saint Louis Federal Bank
+        nextFridays = GetInformation.findNextFridays(numFridays)  # Array of Date-Time Objects
 
-        # Filter out rows with NaN values in crucial columns
-        call = call.dropna()
-        put = put.dropna()
+        # Downloads every export and the current price from Finviz Instrument API concurrently, already parsed
+        chains, stockPrice = GetInformation.fetchOptionChains(tick, nextFridays, finvizKey, max_workers=maxWorkers,
+                                                              requests_per_second=requestsPerSecond, debug=debug)
 
         def safe_float_conversion(value):
             try:
@@ -77,61 +107,241 @@ def createOptionsFile(tick, finvizKey, fedKey, numFridays):
 
         # Convert variables safely
         stockPrice = safe_float_conversion(stockPrice)
-        call['Strike'] = call['Strike'].apply(safe_float_conversion)
-        put['Strike'] = put['Strike'].apply(safe_float_conversion)
-        untilMaturity = safe_float_conversion(untilMaturity)
         fedRate = safe_float_conversion(fedRate)
         historicalVolatility = safe_float_conversion(historicalVolatility)
 
         # Check for None or NaN in the converted values
-        if pd.isnull(stockPrice) or pd.isnull(untilMaturity) or pd.isnull(fedRate) or pd.isnull(historicalVolatility):
+        if pd.isnull(stockPrice) or pd.isnull(fedRate) or pd.isnull(historicalVolatility):
             print("One or more values could not be converted to float.")
             # Handle missing or invalid data as needed
 
-        if call['Strike'].isna().any() or put['Strike'].isna().any():
-            print("One or more strike prices could not be converted to float.")
-            # Handle missing or invalid data as needed
+        # Arrays to accept once the the loops run
+        expirations = []
+        solved = []  # (strikes, until maturity, IV) of every expiration for the surface
+        snapshot = datetime.now(timezone.utc)  # Every expiration from this run is stored under the same snapshot time
 
-        # Calculate stockCall and stockPut for each row
-        call['StockPrice'] = call.apply(
-            lambda row: Greeks.BS_CALL(stockPrice, row['Strike'], untilMaturity, fedRate, historicalVolatility), axis=1)
-        put['StockPrice'] = put.apply(
-            lambda row: Greeks.BS_PUT(stockPrice, row['Strike'], untilMaturity, fedRate, historicalVolatility), axis=1)
-
-        # Proceed with calculations if DataFrames are not empty after filtering
-        if not call.empty:
-            # Add Greeks and perform calculations
-            call['ImpliedVolatility'] = call.apply(
-                lambda row: Greeks.sigmaCall(row['StockPrice'], stockPrice, row['Strike'], untilMaturity, fedRate,
-                                             historicalVolatility, tolerance, maxIter), axis=1)
-            call['Delta'] = call.apply(
-                lambda row: Greeks.calculateDelta(stockPrice, row['Strike'], fedRate, untilMaturity,
-                                                  row['ImpliedVolatility'], 'call'), axis=1)
-            call['Vega'] = call.apply(
-                lambda row: Greeks.calculateVega(stockPrice, row['Strike'], fedRate, untilMaturity,
-                                                 row['ImpliedVolatility']), axis=1)
-            call.to_csv(os.path.join('data', f'{tick}_call_with_greeks_{runningFriday.strftime("%Y-%m-%d")}.csv'),
-                        index=False)
-        else:
-            print("No valid call options to process.")
-
-        if not put.empty:
-            put['ImpliedVolatility'] = put.apply(
-                lambda row: Greeks.sigmaPut(row['StockPrice'], stockPrice, row['Strike'], untilMaturity, fedRate,
-                                            historicalVolatility, tolerance, maxIter), axis=1)
-            put['Delta'] = put.apply(
-                lambda row: Greeks.calculateDelta(stockPrice, row['Strike'], fedRate, untilMaturity,
-                                                  row['ImpliedVolatility'], 'put'), axis=1)
-            put['Vega'] = put.apply(lambda row: Greeks.calculateVega(stockPrice, row['Strike'], fedRate, untilMaturity,
-                                                                     row['ImpliedVolatility']), axis=1)
-            put.to_csv(os.path.join('data', f'{tick}_put_with_greeks_{runningFriday.strftime("%Y-%m-%d")}.csv'),
-                       index=False)
+        # Hot section, profiled when profile is on
+        with Instrument.profiled('pricing'):
+            for i in range(numFridays):
+                runningFriday = nextFridays[i]
+                if isinstance(runningFriday, str):  # Ensure runningFriday is a datetime object
+                    runningFriday = datetime.strptime(runningFriday, "%Y-%m-%d")
+
+                daysUntil = GetInformation.getDaysUntil(runningFriday)
+                untilMaturity = daysUntil / 365  # Until Maturity for calculation
+                expirations.append(untilMaturity) # Gets all the expirations
+
+                expiration = runningFriday.strftime("%Y-%m-%d")
+
+                # Filter out rows with NaN values in crucial columns, Strike is already parsed as a float
+                contracts = chains[i].dropna()
+                print(f'Parsed {len(contracts)} contracts expiring {expiration}')
+
+                # Separated calls and puts are only written out when debugging
+                if debug:
+                    for type_name, group in contracts.groupby('Type', observed=True):
+                        output_file = os.path.join('data', f'{tick}_{type_name}_{expiration}.csv')
+                        group.to_csv(output_file, index=False)
+                        print(f'Saved {type_name} data to {output_file}')
+
+                chain, iterations, converged = priceChain(contracts, stockPrice, untilMaturity, fedRate,
+                                                          historicalVolatility, greeks, tolerance, maxIter, expiration,
+                                                          exercise)
+                if not chain.empty:
+                    solved.append((chain['Strike'].to_numpy()[converged], untilMaturity,
+                                   chain['ImpliedVolatility'].to_numpy()[converged]))
+                    print(f'Implied volatility converged for {converged.sum()}/{len(chain)} contracts, '
+                          f'at most {iterations.max()} iterations')
+
+                # Appends this run to the snapshot store, the CSVs below are only the latest view
+                with Instrument.stage('store', tick=tick, expiration=expiration, rows=len(chain)):
+                    Store.saveSnapshot(tick, runningFriday, chain, snapshot=snapshot)
+
+                with Instrument.stage('write_csv', tick=tick, expiration=expiration, rows=len(chain)):
+                    writeChainFiles(tick, expiration, chain)
+
+        if surface and solved:
+            surfacePath = os.path.join('data', f'{tick}_surface.npz')
+            Surface.VolSurface.fromChain(stockPrice, fedRate,
+                                         np.concatenate([s[0] for s in solved]),
+                                         np.concatenate([np.full(len(s[0]), s[1]) for s in solved]),
+                                         np.concatenate([s[2] for s in solved])).save(surfacePath)
+            print(f'Saved implied volatility surface to {surfacePath}')
+
+        print(f'Cache hits/misses: {GetInformation.cache.stats()}')
+        for source, counts in GetInformation.cache.stats().items():
+            Instrument.event('cache', source=source, **counts)
+        if Instrument.enabled:
+            Instrument.printSummary()
+
+def processTicker(tick, finvizKey, fedKey, numFridays, fedRate, requestsPerSecond, **options):
+    # Input: Same as createOptionsFile, run inside a worker process
+    # Output: (tick, succeeded, error message, seconds taken)
+    # Purpose: Catches everything so one bad ticker is reported instead of killing the whole batch.
+    start = time.perf_counter()
+    try:
+        createOptionsFile(tick, finvizKey, fedKey, numFridays, requestsPerSecond=requestsPerSecond, fedRate=fedRate,
+                          **options)
+        return tick, True, '', time.perf_counter() - start
+    except Exception:
+        return tick, False, traceback.format_exc(limit=3), time.perf_counter() - start
+
+def createOptionsFiles(ticks, finvizKey, fedKey, numFridays, maxProcesses=None, requestsPerSecond=5, **options):
+    # Input: List of ticks, keys, Number of fridays, optional process count and total Finviz rate limit
+    #        Any other createOptionsFile options (greeks, debug, ...) are passed to every ticker
+    # Output: Dictionary of tick -> (succeeded, error message, seconds taken), also printed as a summary
+    # Purpose: Runs createOptionsFile for a whole watchlist across a process pool sized to the machine's cores.
+    maxProcesses = maxProcesses or os.cpu_count() or 1
+    maxProcesses = min(maxProcesses, len(ticks)) or 1
+    fedRate = GetInformation.getFedFundsRate(fedKey)  # Fetched once and handed to every worker
+    # Historical volatility for the whole watchlist from one batched download, a tick left NaN fetches its own
+    try:
+        volatilities = GetInformation.getHistoricalVolatilities(ticks, estimator=options.get('volEstimator', 'close'),
+                                                                window=options.get('volWindow')).to_dict()
+    except Exception as e:  # Every worker downloads its own history instead
+        print(f'Batched price history failed, fetching per tick: {type(e).__name__}: {e}')
+        volatilities = {}
+    workerRate = requestsPerSecond / maxProcesses  # Every process has its own limiter, so split the budget
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=maxProcesses) as pool:
+        futures = [pool.submit(processTicker, tick, finvizKey, fedKey, numFridays, fedRate, workerRate,
+                               historicalVolatility=None if pd.isnull(volatilities.get(tick)) else volatilities[tick],
+                               **options)
+                   for tick in ticks]
+        for future in as_completed(futures):
+            tick, succeeded, error, seconds = future.result()
+            results[tick] = (succeeded, error, seconds)
+            print(f'{tick}: {"done" if succeeded else "FAILED"} in {seconds:.1f}s')
+
+    # Summary
+    failed = [tick for tick in ticks if not results[tick][0]]
+    print(f'Processed {len(ticks) - len(failed)}/{len(ticks)} tickers successfully')
+    for tick in failed:
+        print(f'{tick} failed:\n{results[tick][1]}')
+    return results
+
+def repriceStored(tick, fedKey, numFridays, greeks=('Delta', 'Vega'), stockPrice=None, volEstimator='close',
+                  volWindow=None, exercise='european'):
+    # Input: Tick, Saint Louis Federal Bank APi Key, Number of fridays, Greeks to emit, optional stock price,
+    #        historical volatility estimator and window, exercise style
+    # Output: Dictionary of expiration -> priced chain, also written to the usual CSVs
+    # Purpose: Reprices the latest stored snapshot of every expiration without downloading the chains again.
+    #          The fed funds rate, price history and quote come from the cache when it is fresh.
+    tolerance = 1e-8 #Sigma tolerance for model difference
+    maxIter = 100 #Sigma max iterations
+    historicalVolatility = float(GetInformation.getHistoricalVolatility(tick, estimator=volEstimator,
+                                                                       window=volWindow))
+    fedRate = float(GetInformation.getFedFundsRate(fedKey))
+    if stockPrice is None:
+        stockPrice = GetInformation.getCurrentPrice(tick)
+    stockPrice = float(stockPrice)
+
+    nextFridays = GetInformation.findNextFridays(numFridays)
+    stored = Store.loadSnapshots(tick, columns=list(GetInformation.CHAIN_COLUMNS), expirations=nextFridays,
+                                 latest=True)
+    if stored.empty:
+        print(f'No stored snapshots for {tick}, run fetch first')
+        return {}
+    stored['Last Trade'] = stored['Last Trade'].dt.strftime(Store.TRADE_FORMAT)
+
+    priced = {}
+    for expiration, contracts in stored.groupby('Expiration'):
+        untilMaturity = GetInformation.getDaysUntil(expiration) / 365
+        chain, iterations, converged = priceChain(contracts[list(GetInformation.CHAIN_COLUMNS)].dropna(), stockPrice,
+                                                  untilMaturity, fedRate, historicalVolatility, greeks, tolerance,
+                                                  maxIter, expiration, exercise)
+        writeChainFiles(tick, expiration, chain)
+        priced[expiration] = chain
+        print(f'Repriced {len(chain)} {tick} contracts expiring {expiration}')
+    return priced
+
+# Keys come from the environment first, then from the [keys] section of the config file:
+# [keys]
+# finviz = <Finviz API token>
+# fred = <Saint Louis Federal Bank API key>
+CONFIG_FILE = 'keys.ini'
+
+def loadKeys(configPath=CONFIG_FILE):
+    # Input: Path of the config file
+    # Output: (Finviz key, Fed key), None for any that isn't set
+    config = configparser.ConfigParser()
+    config.read(configPath)
+    finvizKey = os.environ.get('FINVIZ_KEY') or config.get('keys', 'finviz', fallback=None)
+    fedKey = os.environ.get('FRED_KEY') or config.get('keys', 'fred', fallback=None)
+    return finvizKey, fedKey
+
+def main(argv=None):
+    # Command line entry point: python Main.py {fetch,price,graph} TICK [TICK ...] [options]
+    # Heavy imports (matplotlib, yfinance, fredapi, requests) only happen inside the subcommand that needs them.
+    parser = argparse.ArgumentParser(description='Option chains with Black-Scholes Greeks from Finviz exports.')
+    parser.add_argument('--config', default=CONFIG_FILE, help='Config file with a [keys] section')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fetch = commands.add_parser('fetch', help='Download, price and store the chains')
+    fetch.add_argument('ticks', nargs='+')
+    fetch.add_argument('--fridays', type=int, default=5, help='Number of expirations')
+    fetch.add_argument('--greeks', nargs='+', default=['Delta', 'Vega'], choices=Greeks.ALL_GREEKS)
+    fetch.add_argument('--processes', type=int, help='Worker processes when fetching several ticks')
+    fetch.add_argument('--surface', action='store_true', help='Also save an implied volatility surface')
+    fetch.add_argument('--debug', action='store_true', help='Keep the raw exports and split files')
+    fetch.add_argument('--instrument', action='store_true', help='Print per-stage timings')
+    fetch.add_argument('--profile', action='store_true', help='Dump cProfile output of the pricing loop')
+    fetch.add_argument('--vol-estimator', default='close', choices=list(Volatility.ESTIMATORS),
+                       help='Historical volatility estimator used as the pricing volatility')
+    fetch.add_argument('--vol-window', type=int, help='Estimator window in trading days, all of the history by default')
+    fetch.add_argument('--exercise', default='european', choices=list(American.PRICERS),
+                       help='Price as European (Black-Scholes) or American (Barone-Adesi-Whaley) options')
+
+    price = commands.add_parser('price', help='Reprice the latest stored chains without downloading them')
+    price.add_argument('ticks', nargs='+')
+    price.add_argument('--fridays', type=int, default=5, help='Number of expirations')
+    price.add_argument('--greeks', nargs='+', default=['Delta', 'Vega'], choices=Greeks.ALL_GREEKS)
+    price.add_argument('--spot', type=float, help='Stock price to use instead of the quote')
+    price.add_argument('--vol-estimator', default='close', choices=list(Volatility.ESTIMATORS))
+    price.add_argument('--vol-window', type=int)
+    price.add_argument('--exercise', default='european', choices=list(American.PRICERS))
+
+    graph = commands.add_parser('graph', help='Candlestick chart with bollinger bands and SMA')
+    graph.add_argument('ticks', nargs='+')
+    graph.add_argument('--fridays', type=int, default=5, help='Number of expirations')
+    graph.add_argument('--out', help='Directory to save charts to without opening a window')
+    graph.add_argument('--format', default='png', choices=['png', 'svg'])
+    graph.add_argument('--incremental', action='store_true', help='Use the saved incremental indicator state')
+    args = parser.parse_args(argv)
+
+    finvizKey, fedKey = loadKeys(args.config)
+    if args.command == 'fetch':
+        if not finvizKey or not fedKey:
+            parser.error('Set FINVIZ_KEY and FRED_KEY or add them to the config file, see the README')
+        options = dict(greeks=tuple(args.greeks), surface=args.surface, debug=args.debug,
+                       instrument=args.instrument, profile=args.profile, volEstimator=args.vol_estimator,
+                       volWindow=args.vol_window, exercise=args.exercise)
+        if len(args.ticks) == 1:
+            createOptionsFile(args.ticks[0], finvizKey, fedKey, args.fridays, **options)
         else:
-            print("No valid put options to process.")
-
-numFridays=5
-tick = 'DJT'
-finvizKey = '#Fill This In According To README'  #Finviz Key - Refer to keys.txt doc or look at canvas
-fedKey = '#Fill This In According To README'  # Fed key - Refer to keys.txt doc or look at canvas
-createOptionsFile(tick, finvizKey, fedKey, numFridays)
-Graph.createGraph(tick,numFridays)
\ No newline at end of file
+            results = createOptionsFiles(args.ticks, finvizKey, fedKey, args.fridays, args.processes, **options)
+            return 0 if all(succeeded for succeeded, error, seconds in results.values()) else 1
+    elif args.command == 'price':
+        for tick in args.ticks:
+            repriceStored(tick, fedKey, args.fridays, tuple(args.greeks), args.spot, args.vol_estimator,
+                          args.vol_window, args.exercise)
+    elif args.command == 'graph':
+        import Graph  # matplotlib is only loaded for this command
+        if args.out:
+            paths = Graph.exportGraphs(args.ticks, args.fridays, args.out, args.format,
+                                       incremental=args.incremental)
+            return 0 if len(paths) == len(args.ticks) else 1
+        failed = False
+        for tick in args.ticks:
+            try:
+                Graph.createGraph(tick, args.fridays, args.incremental)
+            except ValueError as e:
+                print(f'Chart for {tick} failed: {e}')
+                failed = True
+        return 1 if failed else 0
+    return 0
+
+# Guarded so importing this file (worker processes, Live, Benchmark) has no side effects
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import Greeks
+
+# Scenario / stress repricing: every contract is repriced under a grid of spot shocks, volatility shocks and days
+# forward with one broadcast Black-Scholes call per chunk. Chunks are sized so the temporaries stay under a memory
+# cap, and P&L is summed per scenario as each chunk finishes so the contracts x scenarios cube is never kept unless
+# asked for.
+BYTES_PER_CELL = 8 * 12  # float64 temporaries Black-Scholes holds per (scenario, contract) cell, roughly
+
+
+def scenarioGrid(spotShocks=(0.0,), volShocks=(0.0,), dayShifts=(0,)):
+    # Input: Relative spot shocks (-0.3 is -30%), relative volatility shocks (0.5 is +50%), days forward
+    # Output: DataFrame with one row per combination, columns SpotShock, VolShock, Days
+    spot, vol, days = np.meshgrid(spotShocks, volShocks, dayShifts, indexing='ij')
+    return pd.DataFrame({'SpotShock': spot.ravel(), 'VolShock': vol.ravel(), 'Days': days.ravel()})
+
+def priceUnder(S, K, T, r, sigma, isCall):
+    # Same as Greeks.BS_CHAIN, but contracts already expired (T <= 0) are worth their intrinsic value
+    expired = T <= 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price = Greeks.BS_CHAIN(S, K, np.where(expired, 1.0, T), r, sigma, isCall)
+    intrinsic = np.where(isCall, np.maximum(S - K, 0.0), np.maximum(K - S, 0.0))
+    return np.where(expired, intrinsic, price)
+
+def repriceScenarios(S, K, T, r, sigma, isCall, quantity=1.0, scenarios=None, memoryLimit=256 * 1024 * 1024,
+                     returnCube=False):
+    # Input (in order): Stock price, Strike prices, Until Maturity, Lending rate, Volatility, Call mask,
+    #                   position size per contract, scenarioGrid frame, memory cap in bytes for the temporaries,
+    #                   whether to also return the full scenarios x contracts P&L cube
+    # Output: scenarios frame with a PnL column added, or (frame, cube) when returnCube
+    #         Contracts without a finite volatility or base price (IV the solver couldn't find) are left out of the
+    #         P&L, their count is printed and kept in the frame's attrs['skipped'], and their cube columns are NaN.
+    # Purpose: P&L ladders for a chain or a book of positions.
+    K, T, sigma, isCall, quantity = np.broadcast_arrays(np.asarray(K, dtype=float), np.asarray(T, dtype=float),
+                                                        np.asarray(sigma, dtype=float), np.asarray(isCall, dtype=bool),
+                                                        np.asarray(quantity, dtype=float))
+    scenarios = scenarioGrid() if scenarios is None else scenarios.reset_index(drop=True)
+    spot = S * (1 + scenarios['SpotShock'].to_numpy(dtype=float))
+    volFactor = 1 + scenarios['VolShock'].to_numpy(dtype=float)
+    yearsForward = scenarios['Days'].to_numpy(dtype=float) / 365
+
+    base = priceUnder(S, K, T, r, sigma, isCall)
+    numScenarios, numContracts = len(scenarios), K.size
+    valid = np.flatnonzero(np.isfinite(sigma) & np.isfinite(base) & np.isfinite(quantity))
+    skipped = numContracts - valid.size
+    if skipped:
+        print(f'Skipped {skipped} of {numContracts} contracts without a finite volatility or price')
+    K, T, sigma, isCall, quantity, base = (x.ravel()[valid] for x in (K, T, sigma, isCall, quantity, base))
+    cells = max(1, memoryLimit // BYTES_PER_CELL)  # Cells one chunk may hold
+    contractStep = min(valid.size, cells) or 1
+    scenarioStep = max(1, cells // contractStep)
+
+    pnl = np.zeros(numScenarios)
+    cube = np.full((numScenarios, numContracts), np.nan) if returnCube else None
+    for c in range(0, valid.size, contractStep):
+        columns = slice(c, c + contractStep)
+        k, t, vol, call, qty = K[columns], T[columns], sigma[columns], isCall[columns], quantity[columns]
+        for s in range(0, numScenarios, scenarioStep):
+            rows = slice(s, s + scenarioStep)
+            price = priceUnder(spot[rows, None], k, t - yearsForward[rows, None], r,
+                               np.maximum(vol * volFactor[rows, None], 1e-8), call)
+            change = (price - base[columns]) * qty
+            pnl[rows] += change.sum(axis=1)
+            if returnCube:
+                cube[rows, valid[columns]] = change
+
+    result = scenarios.assign(PnL=pnl)
+    result.attrs['skipped'] = skipped
+    return (result, cube) if returnCube else result
+
+def repricePositions(positions, S, r, scenarios=None, memoryLimit=256 * 1024 * 1024, returnCube=False):
+    # Input: Positions frame with Strike, Type, UntilMaturity, ImpliedVolatility and optionally Quantity columns
+    #        (a chain from createOptionsFile plus UntilMaturity works as is, rows with a NaN ImpliedVolatility
+    #        are skipped), Stock price, Lending rate,
+    #        the rest as in repriceScenarios
+    # Output: Same as repriceScenarios
+    quantity = positions['Quantity'].to_numpy(dtype=float) if 'Quantity' in positions else 1.0
+    return repriceScenarios(S, positions['Strike'].to_numpy(dtype=float),
+                            positions['UntilMaturity'].to_numpy(dtype=float), r,
+                            positions['ImpliedVolatility'].to_numpy(dtype=float),
+                            (positions['Type'] == 'call').to_numpy(), quantity, scenarios, memoryLimit, returnCube)
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+# Append-only columnar storage for option chain snapshots, one directory per snapshot:
+# data/store/<tick>/<expiration>/<snapshot timestamp>/<column>.npy
+# Every column is its own .npy file so reads can memory map just the columns asked for.
+# Prices and Greeks are stored as float32, Type and other text columns as int8/int32 codes with their
+# categories in meta.json, and Last Trade as datetime64 seconds.
+STORE_DIR = os.path.join('data', 'store')
+SNAPSHOT_FORMAT = '%Y%m%dT%H%M%S%f'  # UTC, sorts the same as time so directory names can be range filtered
+TRADE_FORMAT = '%m/%d/%Y %I:%M:%S %p'  # Format of Last Trade in the Finviz export
+
+
+def snapshotName(snapshot=None):
+    # Input: datetime of the snapshot, now when None
+    # Output: Directory name for the snapshot
+    snapshot = snapshot or datetime.now(timezone.utc)
+    return snapshot.strftime(SNAPSHOT_FORMAT)
+
+def encodeColumn(series):
+    # Input: One column of a chain
+    # Output: (compact NumPy array, metadata needed to decode it)
+    if series.name == 'Last Trade':
+        trades = pd.to_datetime(series, format=TRADE_FORMAT, errors='coerce')
+        return trades.to_numpy(dtype='datetime64[s]'), {'kind': 'datetime'}
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=bool), {'kind': 'bool'}
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=np.float32), {'kind': 'float'}
+    categorical = pd.Categorical(series)  # Text columns like Type become codes plus categories
+    codes = categorical.codes.astype(np.int8 if len(categorical.categories) < 128 else np.int32)
+    return codes, {'kind': 'category', 'categories': [str(c) for c in categorical.categories]}
+
+def decodeColumn(values, meta):
+    # Input: Array read from disk and the metadata written by encodeColumn
+    # Output: Array or Categorical ready for a DataFrame
+    if meta['kind'] == 'category':
+        return pd.Categorical.from_codes(np.asarray(values), categories=meta['categories'])
+    return np.asarray(values)
+
+def saveSnapshot(tick, expiration, chain, snapshot=None, root=STORE_DIR):
+    # Input: Tick, expiration date, chain DataFrame, snapshot time (now when None) and store directory
+    # Output: Path of the new snapshot directory
+    # Purpose: Snapshots are never overwritten, they are written to a temporary directory and renamed into place
+    #          so readers never see half a snapshot.
+    if isinstance(expiration, datetime):
+        expiration = expiration.strftime('%Y-%m-%d')
+    directory = os.path.join(root, tick, expiration)
+    final_path = os.path.join(directory, snapshotName(snapshot))
+    temp_path = final_path + '.tmp'
+    os.makedirs(temp_path, exist_ok=True)
+    meta = {'rows': len(chain), 'columns': {}}
+    try:
+        for column in chain.columns:
+            values, meta['columns'][column] = encodeColumn(chain[column])
+            np.save(os.path.join(temp_path, f'{column}.npy'), values)
+        with open(os.path.join(temp_path, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+        os.rename(temp_path, final_path)
+    except BaseException:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+    return final_path
+
+def listSnapshots(tick, expirations=None, start=None, end=None, latest=False, root=STORE_DIR):
+    # Input: Tick, optional expirations, snapshot time range and whether to keep only the newest per expiration
+    # Output: List of (expiration, snapshot datetime, path) sorted by expiration then time
+    # Only directory names are read, no data.
+    tick_dir = os.path.join(root, tick)
+    if not os.path.isdir(tick_dir):
+        return []
+    if expirations is None:
+        expirations = sorted(os.listdir(tick_dir))
+    expirations = [e.strftime('%Y-%m-%d') if isinstance(e, datetime) else e for e in expirations]
+    start = snapshotName(start) if start is not None else None
+    end = snapshotName(end) if end is not None else None
+
+    found = []
+    for expiration in expirations:
+        directory = os.path.join(tick_dir, expiration)
+        if not os.path.isdir(directory):
+            continue
+        names = sorted(n for n in os.listdir(directory) if not n.endswith('.tmp')
+                       and (start is None or n >= start) and (end is None or n <= end))
+        if latest:
+            names = names[-1:]
+        for name in names:
+            snapshot = datetime.strptime(name, SNAPSHOT_FORMAT).replace(tzinfo=timezone.utc)
+            found.append((expiration, snapshot, os.path.join(directory, name)))
+    return found
+
+def loadSnapshots(tick, columns=None, expirations=None, strikes=None, start=None, end=None, latest=False,
+                  root=STORE_DIR):
+    # Input: Tick, columns to read (all when None), expirations, (low, high) strike range, snapshot time range,
+    #        whether to keep only the newest snapshot per expiration, and store directory
+    # Output: DataFrame of the matching rows with Expiration and Snapshot columns added
+    # Purpose: Columns are memory mapped, so only the requested columns and the rows inside the strike range are
+    #          actually read from disk.
+    frames = []
+    for expiration, snapshot, path in listSnapshots(tick, expirations, start, end, latest, root):
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        wanted = list(meta['columns']) if columns is None else [c for c in columns if c in meta['columns']]
+
+        rows = slice(None)
+        if strikes is not None:
+            strike = np.load(os.path.join(path, 'Strike.npy'), mmap_mode='r')
+            rows = np.flatnonzero((strike >= strikes[0]) & (strike <= strikes[1]))
+
+        data = {}
+        for column in wanted:
+            values = np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+            data[column] = decodeColumn(values[rows], meta['columns'][column])
+        frame = pd.DataFrame(data)
+        frame['Expiration'] = expiration
+        frame['Snapshot'] = pd.Timestamp(snapshot)
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=(columns or []) + ['Expiration', 'Snapshot'])
+    return pd.concat(frames, ignore_index=True)
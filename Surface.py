@@ -0,0 +1,101 @@
+import numpy as np
+
+# Implied volatility surface over strike and maturity, built from the solved IVs of every expiration.
+# Each expiration's smile is fitted as a polynomial of total variance (IV^2 * T) in log-moneyness ln(K / forward),
+# maturities are joined by interpolating total variance linearly in T, and the result is precomputed on a dense
+# grid so a query is only an indexed bilinear interpolation, never a refit.
+
+
+def fitSmile(logMoneyness, totalVariance, degree=4):
+    # Input: Log-moneyness and total variance of one expiration, highest polynomial degree
+    # Output: Polynomial coefficients (highest power first) of total variance in log-moneyness
+    # Thin smiles (fewer than 8 strikes) get at most a quadratic, and a single strike is just a flat smile.
+    degree = min(degree, len(np.unique(logMoneyness)) - 1, 2 if len(logMoneyness) < 8 else degree)
+    if degree < 1:
+        return np.array([np.mean(totalVariance)])
+    return np.polyfit(logMoneyness, totalVariance, degree)
+
+
+class VolSurface:
+    # Dense grid of total variance, rows are maturities (tGrid) and columns are log-moneyness (kGrid).
+    # S and r are kept so strikes can be turned into log-moneyness at query time.
+
+    def __init__(self, S, r, tGrid, kGrid, variance):
+        self.S = S
+        self.r = r
+        self.tGrid = tGrid
+        self.kGrid = kGrid
+        self.variance = variance
+
+    @classmethod
+    def fromChain(cls, S, r, strikes, maturities, impliedVolatility, numT=200, numK=200, degree=4):
+        # Input: Stock price, Lending rate, arrays of strike, until maturity and IV (one entry per contract),
+        #        grid size in each direction, highest smile polynomial degree
+        # Output: VolSurface
+        strikes, maturities, impliedVolatility = (np.asarray(x, dtype=float)
+                                                  for x in (strikes, maturities, impliedVolatility))
+        valid = np.isfinite(impliedVolatility) & (impliedVolatility > 0) & (maturities > 0)
+        strikes, maturities, impliedVolatility = strikes[valid], maturities[valid], impliedVolatility[valid]
+        if strikes.size == 0:
+            raise ValueError("No valid implied volatilities to build a surface from.")
+
+        logMoneyness = np.log(strikes / (S * np.exp(r * maturities)))
+        totalVariance = impliedVolatility ** 2 * maturities
+        expiries = np.unique(maturities)
+
+        # Total variance of every fitted smile on the log-moneyness grid. Each smile is held flat past its own
+        # lowest and highest strike instead of extrapolating the polynomial, clamped to stay positive, and kept
+        # non-decreasing in maturity so the surface has no calendar arbitrage
+        kLow, kHigh = logMoneyness.min(), logMoneyness.max()
+        if kHigh - kLow < 1e-6:  # A single strike still needs a grid cell around it
+            kLow, kHigh = kLow - 0.01, kHigh + 0.01
+        kGrid = np.linspace(kLow, kHigh, numK)
+        smiles = []
+        for T in expiries:
+            k, w = logMoneyness[maturities == T], totalVariance[maturities == T]
+            smiles.append(np.polyval(fitSmile(k, w, degree), np.clip(kGrid, k.min(), k.max())))
+        smiles = np.maximum(np.array(smiles), 1e-10)
+        smiles = np.maximum.accumulate(smiles, axis=0)
+
+        # Dense maturity grid, linear in total variance between expiries. Before the first and after the last
+        # expiry the IV is held flat, which is total variance scaling with T
+        tGrid = np.linspace(0, expiries[-1] * 1.25, numT + 1)[1:]
+        variance = np.empty((tGrid.size, kGrid.size))
+        for column in range(kGrid.size):
+            variance[:, column] = np.interp(tGrid, expiries, smiles[:, column])
+        early, late = tGrid < expiries[0], tGrid > expiries[-1]
+        variance[early] = smiles[0] * (tGrid[early] / expiries[0])[:, None]
+        variance[late] = smiles[-1] * (tGrid[late] / expiries[-1])[:, None]
+        return cls(S, r, tGrid, kGrid, variance)
+
+    def impliedVolatility(self, K, T):
+        # Input: Strike and until maturity, scalars or arrays of any matching shape
+        # Output: Interpolated IV with the same shape, points outside the grid use its nearest edge
+        K, T = np.broadcast_arrays(np.asarray(K, dtype=float), np.asarray(T, dtype=float))
+        k = np.log(K / (self.S * np.exp(self.r * T)))
+        tClipped = np.clip(T, self.tGrid[0], self.tGrid[-1])
+        k = np.clip(k, self.kGrid[0], self.kGrid[-1])
+
+        # Cell index and position inside the cell along each axis
+        ti = np.clip(np.searchsorted(self.tGrid, tClipped) - 1, 0, self.tGrid.size - 2)
+        ki = np.clip(np.searchsorted(self.kGrid, k) - 1, 0, self.kGrid.size - 2)
+        tw = (tClipped - self.tGrid[ti]) / (self.tGrid[ti + 1] - self.tGrid[ti])
+        kw = (k - self.kGrid[ki]) / (self.kGrid[ki + 1] - self.kGrid[ki])
+
+        v = self.variance
+        w = ((1 - tw) * ((1 - kw) * v[ti, ki] + kw * v[ti, ki + 1]) +
+             tw * ((1 - kw) * v[ti + 1, ki] + kw * v[ti + 1, ki + 1]))
+        w = w * (T / tClipped)  # Flat IV outside the maturity grid
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sqrt(w / T)
+
+    def save(self, path):
+        # Input: Path of the .npz file
+        np.savez(path, S=self.S, r=self.r, tGrid=self.tGrid, kGrid=self.kGrid, variance=self.variance)
+
+    @classmethod
+    def load(cls, path):
+        # Input: Path written by save
+        # Output: VolSurface, ready to query without refitting
+        with np.load(path) as data:
+            return cls(float(data['S']), float(data['r']), data['tGrid'], data['kGrid'], data['variance'])
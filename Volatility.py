@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# Historical volatility estimators, computed on a whole panel of ticks at once.
+# A panel is a dictionary of field -> DataFrame (rows are dates, columns are ticks) for Open, High, Low, Close and
+# Adj Close, so every estimator is a handful of column-wise DataFrame operations no matter how many ticks there are.
+# Every estimator returns annualized volatility (252 trading days in a year).
+# close - std of daily Adj Close returns, what getHistoricalVolatility always used
+# parkinson - uses the high/low range, more efficient than close to close when there are no gaps
+# garman_klass - adds the open/close move to Parkinson
+# yang_zhang - also handles the overnight gap between yesterday's close and today's open
+# ewma - RiskMetrics exponentially weighted returns (lambda 0.94), reacts faster to recent moves
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close']
+TRADING_DAYS = 252
+EWMA_LAMBDA = 0.94
+
+
+def toPanel(bars, tickers):
+    # Input: Bars as returned by yf.download for one or many ticks, list of those ticks
+    # Output: Panel dictionary of field -> DataFrame with one column per tick
+    if isinstance(bars.columns, pd.MultiIndex):
+        # yfinance puts the field on one level and the tick on the other depending on version and group_by
+        level = 0 if 'Close' in bars.columns.get_level_values(0) else 1
+        fields = bars.columns.get_level_values(level)
+        panel = {field: bars.xs(field, axis=1, level=level) for field in FIELDS if field in fields}
+    else:
+        panel = {field: bars[[field]].set_axis(tickers[:1], axis=1) for field in FIELDS if field in bars}
+    panel.setdefault('Adj Close', panel['Close'])  # Newer yfinance adjusts Close itself and drops Adj Close
+    return {field: frame.reindex(columns=tickers).astype(float) for field, frame in panel.items()}
+
+def rolling(frame, window):
+    # Rolling window over the rows, or every row at once (expanding) when window is None
+    return frame.expanding(min_periods=2) if window is None else frame.rolling(window)
+
+def closeToClose(panel, window=None):
+    returns = panel['Adj Close'].pct_change()
+    return rolling(returns, window).std() * np.sqrt(TRADING_DAYS)
+
+def parkinson(panel, window=None):
+    squaredRange = np.log(panel['High'] / panel['Low']) ** 2 / (4 * np.log(2))
+    return np.sqrt(rolling(squaredRange, window).mean() * TRADING_DAYS)
+
+def garmanKlass(panel, window=None):
+    variance = (0.5 * np.log(panel['High'] / panel['Low']) ** 2
+                - (2 * np.log(2) - 1) * np.log(panel['Close'] / panel['Open']) ** 2)
+    return np.sqrt(rolling(variance, window).mean() * TRADING_DAYS)
+
+def yangZhang(panel, window=None):
+    openPrice, high, low, close = panel['Open'], panel['High'], panel['Low'], panel['Close']
+    overnight = np.log(openPrice / close.shift(1))  # Gap from yesterday's close to today's open
+    intraday = np.log(close / openPrice)
+    rogersSatchell = (np.log(high / close) * np.log(high / openPrice) +
+                      np.log(low / close) * np.log(low / openPrice))
+    n = window if window is not None else overnight.notna().cumsum()  # Observations in each window
+    k = 0.34 / (1.34 + (n + 1) / (n - 1))
+    variance = (rolling(overnight, window).var() + k * rolling(intraday, window).var()
+                + (1 - k) * rolling(rogersSatchell, window).mean())
+    return np.sqrt(variance * TRADING_DAYS)
+
+def ewma(panel, window=None):
+    # window is ignored, the weights decay with EWMA_LAMBDA instead
+    returns = panel['Adj Close'].pct_change()
+    return np.sqrt((returns ** 2).ewm(alpha=1 - EWMA_LAMBDA, adjust=False).mean() * TRADING_DAYS)
+
+ESTIMATORS = {
+    'close': closeToClose,
+    'parkinson': parkinson,
+    'garman_klass': garmanKlass,
+    'yang_zhang': yangZhang,
+    'ewma': ewma,
+}
+
+
+def estimateVolatility(panel, estimator='close', window=None):
+    # Input: Panel, estimator name from ESTIMATORS, rolling window in trading days (every row when None)
+    # Output: Series of tick -> latest annualized volatility
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator {estimator}. Use any of {', '.join(ESTIMATORS)}.")
+    series = ESTIMATORS[estimator](panel, window)
+    return series.ffill().iloc[-1]  # Last available value per tick, a tick without today's bar keeps yesterday's
+
+def volatilityTable(panel, estimators=tuple(ESTIMATORS), windows=(10, 20, 30)):
+    # Input: Panel, estimator names, window lengths
+    # Output: DataFrame with one row per tick and a column per (estimator, window)
+    table = {(estimator, window): estimateVolatility(panel, estimator, window)
+             for estimator in estimators for window in windows}
+    return pd.DataFrame(table).rename_axis(columns=['estimator', 'window'])